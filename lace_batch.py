@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2026, the inkscape-bobbinlace contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Render many prickings in parallel without InkScape.
+
+A manifest is a JSON file with a list of jobs and optional defaults:
+
+    {
+      "defaults": {"ground": {"outputmode": "compound"}},
+      "jobs": [
+        {"effect": "ground", "file": "templates/4x4_*.txt",
+         "angle": [45, 60], "distance": [2, 3, 5],
+         "output": "out/{name}-{angle}-{distance}.svg"}
+      ]
+    }
+
+effect is one of ground, circular, grid or polar. The other keys are the
+options of that effect, the .inx file of the effect provides the values that
+are not specified. Defaults apply to all jobs, those in an object named
+after an effect only to the jobs of that effect. A list of values or a file
+name pattern expands the job into one job per value, combined with all other
+lists. The output name may refer to any option, to {name}, the template name
+without extension, and to {index}, the number of the job.
+input is the document to draw on, a blank A4 page by default.
+Relative paths are relative to the manifest.
+
+    python lace_batch.py manifest.json --jobs 8 --summary summary.json
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import tempfile
+import itertools
+import importlib
+import multiprocessing
+
+from lxml import etree
+
+__license__ = 'Simplified BSD'
+__version__ = '__VERSION__'
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# effect name: module, class
+EFFECTS = {
+    'ground': ('lace_ground', 'LaceGround'),
+    'circular': ('lace_circular_ground', 'CircularGround'),
+    'grid': ('lace_grid', 'LaceGrid'),
+    'polar': ('lace_polar', 'PolarGrid'),
+}
+
+# keys of a job that are not options of the effect
+RESERVED = ('effect', 'output', 'input')
+
+BLANK = '''<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:xlink="http://www.w3.org/1999/xlink"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"
+     width="210mm" height="297mm" viewBox="0 0 210 297">
+  <sodipodi:namedview id="namedview1" inkscape:current-layer="layer1"/>
+  <g inkscape:groupmode="layer" id="layer1" inkscape:label="Layer 1"/>
+</svg>
+'''
+
+
+def inxDefaults(effect):
+    """
+    Default option values of an effect, as InkScape would pass them
+    from the dialog described by its .inx file.
+    """
+    module = EFFECTS[effect][0]
+    tree = etree.parse(os.path.join(HERE, module + '.inx'))
+    defaults = {}
+    for param in tree.iter('{*}param'):
+        type = param.get('type')
+        name = param.get('name')
+        if type == 'description' or name in defaults:
+            continue
+        if type in ('optiongroup', 'enum', 'notebook'):
+            options = [child.get('value') for child in param if isinstance(child.tag, str)]
+            value = options[0] if options else ''
+        else:
+            value = (param.text or '').strip()
+            if type == 'int' and value:
+                value = str(int(float(value)))
+        defaults[name] = value
+    return defaults
+
+
+def resolve(value, base):
+    """
+    Make a relative path relative to the manifest directory.
+    """
+    if value and not os.path.isabs(value):
+        return os.path.join(base, value)
+    return value
+
+
+def expand(manifest, base):
+    """
+    Expand the jobs of a manifest into single jobs,
+    one for each combination of the listed values and matched files.
+    """
+    defaults = manifest.get('defaults', {})
+    common = dict((key, value) for key, value in defaults.items() if key not in EFFECTS)
+    jobs = []
+    for spec in manifest['jobs']:
+        effect = spec['effect']
+        if effect not in EFFECTS:
+            raise ValueError('Unknown effect: %s' % effect)
+        spec = dict(common, **dict(defaults.get(effect, {}), **spec))
+        if 'file' in spec:
+            patterns = spec['file'] if isinstance(spec['file'], list) else [spec['file']]
+            files = []
+            for pattern in patterns:
+                files.extend(sorted(glob.glob(resolve(pattern, base))) or [resolve(pattern, base)])
+            spec['file'] = files
+        keys = sorted(key for key in spec if key not in RESERVED)
+        values = [spec[key] if isinstance(spec[key], list) else [spec[key]] for key in keys]
+        for combination in itertools.product(*values):
+            options = dict(inxDefaults(effect))
+            options.update(zip(keys, combination))
+            fields = dict(options)
+            fields['effect'] = effect
+            fields['name'] = os.path.splitext(os.path.basename(options.get('file') or effect))[0]
+            fields['index'] = len(jobs)
+            jobs.append({
+                'effect': effect,
+                'options': options,
+                'input': resolve(spec.get('input'), base),
+                'output': resolve(spec.get('output', '{effect}-{index}.svg').format(**fields), base),
+            })
+    return jobs
+
+
+def arguments(options):
+    """
+    Command line arguments for the options of a job.
+    """
+    return ['--%s=%s' % (key, value) for key, value in sorted(options.items())]
+
+
+def runJob(job):
+    """
+    Run one job in the current process.
+    Returns a summary of the job.
+    """
+    summary = {'effect': job['effect'], 'output': job['output'], 'options': job['options']}
+    start = time.time()
+    blank = None
+    try:
+        module, name = EFFECTS[job['effect']]
+        effect = getattr(importlib.import_module(module), name)()
+        document = job['input']
+        if not document:
+            handle, blank = tempfile.mkstemp(suffix='.svg')
+            with os.fdopen(handle, 'w') as f:
+                f.write(BLANK)
+            document = blank
+        directory = os.path.dirname(job['output'])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        effect.run(arguments(job['options']) + [document], output=job['output'])
+        summary['status'] = 'ok'
+        summary['bytes'] = os.path.getsize(job['output'])
+    except SystemExit as e:
+        # the effects exit after reporting invalid input on stderr
+        summary['status'] = 'failed'
+        summary['error'] = 'stopped with exit status %s' % (e.code or 0)
+    except Exception as e:
+        summary['status'] = 'failed'
+        summary['error'] = '%s: %s' % (type(e).__name__, e)
+    finally:
+        if blank:
+            os.remove(blank)
+    summary['seconds'] = round(time.time() - start, 3)
+    return summary
+
+
+def runBatch(jobs, processes=None):
+    """
+    Run jobs on a pool of processes, one per core by default.
+    Returns the summaries in the order of the jobs.
+    """
+    if processes == 1:
+        return [runJob(job) for job in jobs]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(runJob, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Render prickings for all jobs of a manifest.')
+    parser.add_argument('manifest', help='JSON file with the jobs')
+    parser.add_argument('--jobs', type=int, default=None, help='number of processes, default: number of cores')
+    parser.add_argument('--summary', help='write the summary report to this JSON file')
+    parser.add_argument('--dry-run', action='store_true', dest='dryRun', help='only list the expanded jobs')
+    args = parser.parse_args()
+
+    sys.path.insert(0, HERE)
+    with open(args.manifest, 'r') as f:
+        manifest = json.load(f)
+    jobs = expand(manifest, os.path.dirname(os.path.abspath(args.manifest)))
+    if args.dryRun:
+        for job in jobs:
+            print('%s %s %s' % (job['effect'], job['output'], ' '.join(arguments(job['options']))))
+        sys.exit(0)
+
+    start = time.time()
+    summaries = runBatch(jobs, args.jobs)
+    elapsed = time.time() - start
+    failed = [s for s in summaries if s['status'] != 'ok']
+    for s in summaries:
+        print('%-6s %7.2fs %10s  %s%s' % (s['status'], s['seconds'], s.get('bytes', ''),
+              s['output'], '  ' + s['error'] if 'error' in s else ''))
+    print('%d jobs, %d failed, %.2fs' % (len(summaries), len(failed), elapsed))
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump({'jobs': summaries, 'failed': len(failed), 'seconds': round(elapsed, 3)}, f, indent=1)
+    sys.exit(1 if failed else 0)
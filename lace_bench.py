@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2026, the inkscape-bobbinlace contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Measure how the effects scale.
+
+Each case runs one effect on a blank in-memory page and records the wall
+time, the peak memory of the process, the number of generated elements and
+the size of the output. A suite is a manifest like those of lace_batch.py,
+output names are ignored. Without a suite the built-in SUITE below sweeps the
+size parameters of all four effects.
+
+Every case runs in a fresh process, one case at a time, so the cases don't
+share caches or memory and don't compete for the processor. The time is the
+best of --repeat runs.
+
+    python lace_bench.py --save baseline.json
+    python lace_bench.py --compare baseline.json --tolerance 0.2
+    python lace_bench.py suite.json --repeat 5 --save results.json
+
+Comparing exits with status 1 when a case got slower or bigger than the
+tolerance allows, or when it generates a different number of elements.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import platform
+import importlib
+import multiprocessing
+
+from lxml import etree
+
+from lace_batch import EFFECTS, BLANK, expand, inxDefaults, arguments
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__license__ = 'Simplified BSD'
+__version__ = '__VERSION__'
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FORMAT = 1
+
+SUITE = {
+    'defaults': {
+        'ground': {'file': 'templates/4x4_10.txt', 'patchunits': 'mm', 'pinunits': 'mm'},
+        'circular': {'file': 'templates/4x4_10.txt'},
+        'grid': {'patchunits': 'mm', 'pinunits': 'mm'},
+    },
+    'jobs': [
+        {'effect': 'ground', 'width': [25, 50, 100], 'height': [25, 50], 'distance': 2},
+        {'effect': 'ground', 'file': ['templates/2x2_2.txt', 'templates/4x4_100.txt', 'templates/bias.txt'],
+         'width': 50, 'height': 50, 'distance': 2},
+        {'effect': 'ground', 'width': 50, 'height': 50, 'distance': 2,
+         'outputmode': ['paths', 'compound'], 'xrand': [0, 10], 'yrand': 10, 'seed': 1},
+        {'effect': 'ground', 'width': 100, 'height': 50, 'distance': 2, 'chain': True},
+        {'effect': 'circular', 'cols': [30, 60], 'rows': [3, 10]},
+        {'effect': 'circular', 'cols': 60, 'rows': 10, 'symmetry': ['none', 'use']},
+        {'effect': 'grid', 'width': [50, 100, 200], 'height': [50, 100], 'distance': 2},
+        {'effect': 'grid', 'width': 100, 'height': 100, 'distance': 2,
+         'outputmode': ['circles', 'compound'], 'xrand': [0, 10], 'yrand': 10, 'seed': 1},
+        {'effect': 'grid', 'width': 200, 'height': 200, 'distance': 2, 'xrand': 40, 'yrand': 40, 'seed': 1,
+         'overlaps': 'mark'},
+        {'effect': 'polar', 'dots': [45, 180, 400], 'outerDiameter': [160, 500], 'innerDiameter': 10},
+        {'effect': 'polar', 'dots': 180, 'variant': ['', 'hexagon2', 'snow1', 'snow2']},
+        {'effect': 'polar', 'dots': 400, 'outerDiameter': 500, 'innerDiameter': 10, 'outputmode': 'compound'},
+        {'effect': 'grid', 'width': 200, 'height': 200, 'distance': 2, 'order': ['curve', 'nearest', 'twoopt']},
+        {'effect': 'polar', 'dots': 400, 'outerDiameter': 500, 'innerDiameter': 10, 'order': 'curve'},
+    ],
+}
+
+
+def caseId(job):
+    """
+    Name of a case: the effect and the options that differ from the dialog.
+    Template files are named relative to the suite when possible.
+    """
+    defaults = inxDefaults(job['effect'])
+    options = {}
+    for key, value in job['options'].items():
+        if str(value) == defaults.get(key):
+            continue
+        if key == 'file':
+            value = os.path.relpath(value, HERE) if value.startswith(HERE) else value
+        options[key] = value
+    return ' '.join([job['effect']] + arguments(options))
+
+
+def peakMemory():
+    """
+    Peak resident memory of this process in kB, None where unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def countElements(text):
+    """
+    Number of elements in a document.
+    """
+    return sum(1 for element in etree.fromstring(text).iter() if isinstance(element.tag, str))
+
+
+def runCase(job):
+    """
+    Run one case in the current process.
+    Returns the measurements of the case.
+    """
+    module, name = EFFECTS[job['effect']]
+    effect = getattr(importlib.import_module(module), name)()
+    output = io.BytesIO()
+    start = time.time()
+    try:
+        # what Effect.run does, reading the page from memory
+        effect.parse_arguments(arguments(job['options']))
+        effect.options.input_file = io.BytesIO(BLANK.encode('utf-8'))
+        effect.options.output = output
+        effect.load_raw()
+        effect.save_raw(effect.effect())
+    except SystemExit as e:
+        # the effects exit after reporting invalid input on stderr
+        raise RuntimeError('stopped with exit status %s' % (e.code or 0))
+    finally:
+        effect.clean_up()
+    seconds = time.time() - start
+    text = output.getvalue()
+    return {
+        'seconds': seconds,
+        'peak_kb': peakMemory(),
+        'elements': countElements(text) - BLANK_ELEMENTS,
+        'bytes': len(text),
+    }
+
+
+def measure(job, repeat=1):
+    """
+    Run a case repeat times, each time in a fresh process.
+    Returns the best time and the measurements of that run.
+    """
+    best = None
+    for i in range(repeat):
+        pool = multiprocessing.get_context('spawn').Pool(1)
+        try:
+            result = pool.apply(runCase, (job,))
+        finally:
+            pool.close()
+            pool.join()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    best['seconds'] = round(best['seconds'], 4)
+    return best
+
+
+def runSuite(suite, base, repeat=1, log=None):
+    """
+    Measure all cases of a suite.
+    Returns the report with one entry per case.
+    """
+    cases = []
+    for job in expand(suite, base):
+        entry = {'id': caseId(job), 'effect': job['effect'], 'options': job['options']}
+        try:
+            entry.update(measure(job, repeat))
+            entry['status'] = 'ok'
+        except Exception as e:
+            entry['status'] = 'failed'
+            entry['error'] = '%s: %s' % (type(e).__name__, e)
+        cases.append(entry)
+        if log:
+            log(entry)
+    return {
+        'format': FORMAT,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'cases': cases,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Compare a report with a saved baseline, case by case.
+    Returns lines describing each case and the number of regressions.
+    A case regresses when its time, memory or output size grows by more than
+    the tolerance (a fraction) or when its number of elements changes.
+    """
+    previous = dict((case['id'], case) for case in baseline['cases'])
+    lines = []
+    regressions = 0
+    for case in report['cases']:
+        old = previous.get(case['id'])
+        if old is None or old.get('status') != 'ok' or case['status'] != 'ok':
+            lines.append('%-8s %s' % ('new' if old is None else case['status'], case['id']))
+            continue
+        flags = []
+        ratios = []
+        for key in ('seconds', 'peak_kb', 'bytes'):
+            if not old.get(key) or case.get(key) is None:
+                ratios.append('    -')
+                continue
+            ratio = case[key] / old[key]
+            ratios.append('%5.2f' % ratio)
+            if ratio > 1 + tolerance:
+                flags.append(key)
+        if case['elements'] != old['elements']:
+            flags.append('elements %d -> %d' % (old['elements'], case['elements']))
+        if flags:
+            regressions += 1
+        lines.append('%-8s %s  %s%s' % ('WORSE' if flags else 'ok', ' '.join(ratios), case['id'],
+                                        '  (' + ', '.join(flags) + ')' if flags else ''))
+    return lines, regressions
+
+
+def show(entry):
+    if entry['status'] == 'ok':
+        print('%8.3fs %8s kB %9d el %11d B  %s' % (entry['seconds'], entry['peak_kb'] or '-',
+              entry['elements'], entry['bytes'], entry['id']))
+    else:
+        print('%-8s %s  %s' % (entry['status'], entry['id'], entry['error']))
+
+
+BLANK_ELEMENTS = countElements(BLANK.encode('utf-8'))
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Measure how the effects scale.')
+    parser.add_argument('suite', nargs='?', help='JSON manifest with the cases, default: the built-in suite')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best time counts')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed growth of time, memory and size when comparing, as a fraction')
+    args = parser.parse_args()
+
+    sys.path.insert(0, HERE)
+    if args.suite:
+        with open(args.suite, 'r') as f:
+            suite = json.load(f)
+        base = os.path.dirname(os.path.abspath(args.suite))
+    else:
+        suite = SUITE
+        base = HERE
+    report = runSuite(suite, base, args.repeat, show)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=1)
+    failed = [case for case in report['cases'] if case['status'] != 'ok']
+    regressions = 0
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        lines, regressions = compare(report, baseline, args.tolerance)
+        print('\nratio to %s: seconds peak_kb bytes' % args.compare)
+        for line in lines:
+            print(line)
+        print('%d cases, %d worse' % (len(lines), regressions))
+    sys.exit(1 if failed or regressions else 0)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2026, the inkscape-bobbinlace contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Catalogue of the templates in a directory.
+
+The catalogue is one JSON file. For each template it records the name, the
+text and image file, the type, rows and cols, the number of nodes and edges
+of one repeat and the bounding box of the coordinates in grid units, and the
+size and SHA-1 of the text file. Queries only read that file.
+
+A catalogue that no longer matches the templates is updated: templates
+added or edited since are described again, like lace_template recompiles
+them. The update goes to the cache directory of lace_template, the
+template directory may be read-only after installation. A catalogue.json
+next to the templates serves as a start, --build rewrites that file.
+
+Examples:
+    python lace_catalogue.py --build templates
+    python lace_catalogue.py templates --rows 4 --cols 4 --max-nodes 12
+    python lace_catalogue.py templates --name '2x*' --format table
+"""
+
+import os
+import json
+import hashlib
+from fnmatch import fnmatch
+from math import floor
+
+from lace_template import loadCompiled, cacheDir
+
+__license__ = 'Simplified BSD'
+__version__ = '__VERSION__'
+
+INDEX = 'catalogue.json'
+FORMAT = 2
+
+
+def describe(fileName):
+    """
+    Catalogue entry for one template file.
+    Nodes and edges are counted for one repeat of the template:
+    coordinates referring to a neighbouring repeat are wrapped into the tile.
+    """
+    type, rows, cols, counts, coords, rotated = loadCompiled(fileName)
+    xs = coords[0::2]
+    ys = coords[1::2]
+
+    def wrap(x, y):
+        return (x - floor(x / cols) * cols, y - floor(y / rows) * rows)
+
+    nodes = set()
+    edges = set()
+    for i in range(0, len(coords), 6):
+        x1, y1, x2, y2, x3, y3 = coords[i:i+6]
+        nodes.update([wrap(x1, y1), wrap(x2, y2), wrap(x3, y3)])
+        for p, q in (((x1, y1), (x2, y2)), ((x1, y1), (x3, y3))):
+            p, q = min(p, q), max(p, q)
+            dx = floor(p[0] / cols) * cols
+            dy = floor(p[1] / rows) * rows
+            edges.add((p[0] - dx, p[1] - dy, q[0] - dx, q[1] - dy))
+
+    base = os.path.splitext(fileName)[0]
+    return {
+        'name': os.path.basename(base),
+        'file': os.path.basename(fileName),
+        'image': os.path.basename(base) + '.png' if os.path.isfile(base + '.png') else None,
+        'type': type,
+        'rows': rows,
+        'cols': cols,
+        'cells': sum(counts),
+        'nodes': len(nodes),
+        'edges': len(edges),
+        'bbox': [min(xs), min(ys), max(xs), max(ys)] if coords else None,
+        'size': os.path.getsize(fileName),
+        'sha1': digest(fileName),
+    }
+
+
+def digest(fileName):
+    """
+    SHA-1 of the contents of the file, as hex digits.
+    """
+    with open(fileName, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def current(entry, directory):
+    """
+    True when the template file did not change since the entry was made.
+    The contents are compared, not the modification time: the shipped
+    catalogue is built before the release is zipped, and zip files keep
+    times to two seconds only.
+    """
+    fileName = os.path.join(directory, entry['file'])
+    try:
+        if entry.get('size') != os.path.getsize(fileName):
+            return False
+        return entry.get('sha1') == digest(fileName)
+    except OSError:
+        return False
+
+
+def templateNames(directory):
+    """
+    Sorted names of the template files in the directory.
+    """
+    return sorted(name for name in os.listdir(directory) if name.endswith('.txt'))
+
+
+def cachedIndex(directory):
+    """
+    Location of the catalogue of the directory in the cache.
+    """
+    key = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()
+    return os.path.join(cacheDir(), 'catalogue-' + key + '.json')
+
+
+def readCatalogue(index):
+    """
+    The catalogue in the file, None when it is missing, unreadable or of another format.
+    """
+    try:
+        with open(index, 'r') as f:
+            catalogue = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return catalogue if catalogue.get('format') == FORMAT else None
+
+
+def writeCatalogue(catalogue, targets):
+    """
+    Write the catalogue to the first of the targets that can be written.
+    Returns that target, None when none can: a catalogue that can't be
+    written only costs speed.
+    """
+    for target in targets:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            temp = '%s.%d.tmp' % (target, os.getpid())
+            # one line per template keeps the file readable and diffs small
+            with open(temp, 'w') as f:
+                f.write('{"format": %d, "templates": [\n' % FORMAT)
+                f.write(',\n'.join(json.dumps(entry) for entry in catalogue['templates']))
+                f.write('\n]}\n')
+            os.replace(temp, target)
+            return target
+        except OSError:
+            continue
+    return None
+
+
+def buildCatalogue(directory, old=None):
+    """
+    Describe the templates in the directory, reusing the entries of an old
+    catalogue for the files that did not change. Returns the catalogue.
+    """
+    known = {}
+    if old is not None:
+        known = dict((entry['file'], entry) for entry in old['templates'] if current(entry, directory))
+    return {
+        'format': FORMAT,
+        'templates': [known.get(name) or describe(os.path.join(directory, name))
+                      for name in templateNames(directory)],
+    }
+
+
+def loadCatalogue(directory, rebuild=False):
+    """
+    Read the catalogue of the directory, from the cache or from the
+    catalogue.json next to the templates, whichever is up to date.
+    Otherwise it is updated and written to the cache, or to the template
+    directory when the cache can't be written. rebuild describes all
+    templates again and writes catalogue.json next to them when possible.
+    """
+    index = os.path.join(directory, INDEX)
+    cached = cachedIndex(directory)
+    if rebuild:
+        catalogue = buildCatalogue(directory)
+        writeCatalogue(catalogue, [index, cached])
+        return catalogue
+    names = templateNames(directory)
+    old = None
+    for path in (cached, index):
+        catalogue = readCatalogue(path)
+        if catalogue is None:
+            continue
+        if ([entry['file'] for entry in catalogue['templates']] == names and
+                all(current(entry, directory) for entry in catalogue['templates'])):
+            return catalogue
+        old = old or catalogue
+    catalogue = buildCatalogue(directory, old)
+    writeCatalogue(catalogue, [cached, index])
+    return catalogue
+
+
+def query(catalogue, name=None, type=None, rows=None, cols=None,
+          minNodes=None, maxNodes=None, minEdges=None, maxEdges=None,
+          maxWidth=None, maxHeight=None):
+    """
+    Entries of the catalogue that match all given criteria.
+    name is a file name pattern like '4x4_1*'.
+    maxWidth and maxHeight limit the size of the bounding box in grid units.
+    """
+    found = []
+    for entry in catalogue['templates']:
+        if name is not None and not fnmatch(entry['name'], name):
+            continue
+        if type is not None and entry['type'] != type:
+            continue
+        if rows is not None and entry['rows'] != rows:
+            continue
+        if cols is not None and entry['cols'] != cols:
+            continue
+        if minNodes is not None and entry['nodes'] < minNodes:
+            continue
+        if maxNodes is not None and entry['nodes'] > maxNodes:
+            continue
+        if minEdges is not None and entry['edges'] < minEdges:
+            continue
+        if maxEdges is not None and entry['edges'] > maxEdges:
+            continue
+        bbox = entry['bbox']
+        if maxWidth is not None and (bbox is None or bbox[2] - bbox[0] > maxWidth):
+            continue
+        if maxHeight is not None and (bbox is None or bbox[3] - bbox[1] > maxHeight):
+            continue
+        found.append(entry)
+    return found
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Find lace ground templates.')
+    parser.add_argument('directory', nargs='?', default='templates', help='template directory')
+    parser.add_argument('--build', action='store_true', help='(re)build catalogue.json in the template directory')
+    parser.add_argument('--name', help='file name pattern, e.g. "4x4_1*"')
+    parser.add_argument('--type', help='template type, e.g. CHECKER')
+    parser.add_argument('--rows', type=int)
+    parser.add_argument('--cols', type=int)
+    parser.add_argument('--min-nodes', type=int, dest='minNodes')
+    parser.add_argument('--max-nodes', type=int, dest='maxNodes')
+    parser.add_argument('--min-edges', type=int, dest='minEdges')
+    parser.add_argument('--max-edges', type=int, dest='maxEdges')
+    parser.add_argument('--max-width', type=float, dest='maxWidth')
+    parser.add_argument('--max-height', type=float, dest='maxHeight')
+    parser.add_argument('--format', choices=['paths', 'table', 'json'], default='paths')
+    args = parser.parse_args()
+
+    catalogue = loadCatalogue(args.directory, rebuild=args.build)
+    found = query(catalogue, name=args.name, type=args.type, rows=args.rows, cols=args.cols,
+                  minNodes=args.minNodes, maxNodes=args.maxNodes,
+                  minEdges=args.minEdges, maxEdges=args.maxEdges,
+                  maxWidth=args.maxWidth, maxHeight=args.maxHeight)
+    if args.format == 'json':
+        print(json.dumps(found, indent=1))
+    elif args.format == 'table':
+        print('name\ttype\trows\tcols\tnodes\tedges\tbbox')
+        for entry in found:
+            print('%s\t%s\t%d\t%d\t%d\t%d\t%s' % (entry['name'], entry['type'], entry['rows'],
+                  entry['cols'], entry['nodes'], entry['edges'], entry['bbox']))
+    else:
+        for entry in found:
+            print(os.path.join(args.directory, entry['file']))
@@ -26,9 +26,21 @@
 import sys
 import os
 from math import sin, cos, acos, tan, radians, pi, sqrt, ceil, floor
+from array import array
+from itertools import islice
 
 import inkex
 from lxml import etree
+from lace_template import loadTemplate
+from lace_output import SvgStream, parameters, findGenerated, changedParameters, outputGroup, restyle
+from lace_output import draftBudget, PathEncoder, GeometryExport, EXPORT_FORMATS
+from lace_geometry import chain
+import lace_profile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 __author__ = 'Ben Connors'
 __credits__ = ['Ben Connors', 'Veronika Irvine', 'Jo Pol', 'Mark Shafer']
@@ -75,6 +87,9 @@ class Vector:
 
 class CircularGround(inkex.Effect):
 
+    ## Options that only change the style of the lines
+    STYLE = ('linewidth','lineunits','linecolor')
+
     def unitToUu(self,param):
         """ Convert units.
         Converts a number in some units into the units used internally by 
@@ -120,34 +135,25 @@ class CircularGround(inkex.Effect):
         if extension != '.txt':
             inkex.errormsg('The file name must end with .txt.\n\nYour entry: '+self.options.file)
             exit()
-            
-        data = []
-        rows, cols = -1, -1
-        with open(self.options.file,'r') as f:
-            for line in f:
-                line = line.strip()
-                ## If rows is not a positive integer, we're on the first line
-                if rows == -1:
-                    tmp = line.split('\t')
-                    _type,cols,rows = tmp[0],int(tmp[1]),int(tmp[2])
-                else:
-                    data.append([])
-                    for cell in line[1:-1].split(']\t['):
-                        cell = cell.strip()
-                        ## The pattern must be rotated 90 degrees clockwise. It's
-                        ## simplest to just do that here
-                        tmp = [float(n) for n in cell.split(',')]
-                        data[-1].append([a for b in zip([rows-i for i in tmp[1::2]],[cols-i for i in tmp[::2]]) for a in b])
-        return {'type': _type, 'rows': rows, 'cols': cols, 'data' : data}
+
+        ## The pattern must be rotated 90 degrees clockwise,
+        ## the template loader does that for us
+        return loadTemplate(self.options.file,rotated=True)
 
     def line(self,points):
         """
-        Draw a line from point at (x1, y1) to point at (x2, y2).
-        Style of line is hard coded and specified by 's'.
+        Draw a line connecting all points in order
+        with the style of the generated group.
         """
-        # define the motions
-        path = ('M%.4f,%.4fL' % tuple(points[0][:2])) + 'L'.join([('%f,%f' % tuple(a[:2])) for a in points[1:]])
+        self.path(self.encoder.path([a[:2] for a in points]))
+
+    def motions(self,points):
+        """ Path motions for a line connecting all points in order,
+        continuing the motions before it."""
+        return self.encoder.polyline([a[:2] for a in points])
 
+    def lineStyle(self):
+        """ Style of the lines."""
         # define the stroke style
         s = {'stroke-linejoin': 'miter', 
             'stroke-width': self.options.linewidth,
@@ -158,14 +164,32 @@ class CircularGround(inkex.Effect):
             'stroke-linejoin': 'miter',
             'fill': 'none'
         }
+        return str(inkex.Style(s))
 
-
-        ## Attributes for new element
-        attribs = {'style':str(inkex.Style(s)),
-                   'd' : path}
+    def path(self,path):
+        """ Insert a path with motions 'path' into the generated group."""
+        ## Attributes for new element, the style is that of the group
+        attribs = {'d' : path}
 
         ## Add new element
-        etree.SubElement(self.svg.get_current_layer(), inkex.addNS('path', 'svg'), attribs)
+        self.addElement(inkex.addNS('path', 'svg'), attribs)
+
+    def addElement(self,tag,attribs):
+        """ Insert a new element into the generated group,
+        or write it straight to the output when streaming.
+        """
+        if self.stream:
+            self.stream.add(tag,attribs)
+        else:
+            etree.SubElement(self.layer,tag,attribs)
+
+    def compound(self,motions):
+        """ Draw a list of subpath motions as one compound path,
+        or as chunks of at most --chunk subpaths.
+        """
+        size = self.options.chunk or len(motions) or 1
+        for i in range(0,len(motions),size):
+            self.path(''.join(motions[i:i+size]))
 
     def baseVectors(self,segments):
         """ Create vectors for all vertices on the specified polygon."""
@@ -184,36 +208,22 @@ class CircularGround(inkex.Effect):
     def fuzzyEquality(self,a,b):
         return (a-b <= 1e-8)
 
-    def circleWrap(self,points,segments):
-        """ Wrap a grid around the origin.
-        <<points>> is a list of 2- or 3-tuples.
-            In the case of 3-tuples, they should be laid out like: (x,y,name)
-            Whereas 2-tuples should eliminate the name portion.
-                Only one format may be passed; they may not be mixed.
-            x- and y- values are rounded to the nearest integer.
-                If more precision is desired, scale up the points before calling this function.
-            x-values should be within [0,segments)
-                Values not within range will be moved within range.
-            y-values must be greater than 0
-                An error will be raised if a y-value is less than 0.
-            The 'name' portion is not touched by this function; it is merely
-            passed along. This may be used to identify points or groups of points.
-        <<radius>> is the inside radius (i.e. distance to origin from a point with
-            a y-value of 0).
-        <<segments>> is the number of segments (sides) of the polygon.
-        <<angle>> is the angle of the diagonal of the square approximation. It must be
-            somewhere on (0,pi/2).
+    def wrapTables(self,segments):
+        """ Tables for wrapping a grid around the origin.
+        Returns the vertices of the inner polygon, the radius factor of
+        the next ring, the growth between two rings and a function that
+        gives (cos, sin, factor) of the rotation for a fraction of a segment.
         """
         angle = self.options.angle
         if angle <= 0 or angle >= pi/2:
             raise ValueError('Angle must be in (0,pi/2)')
 
-        vectors = self.baseVectors(segments)
+        vectors = [v.tuple for v in self.baseVectors(segments)]
         theta = 2*pi/segments
         
         """
         Determine the coefficient to multiply the vectors by in order to deal
-        with a higher x-value.
+        with a higher y-value.
         With R being the large radius (radius to next y-value) and r being the
         small radius (radius to current y-value):
         
@@ -230,70 +240,103 @@ class CircularGround(inkex.Effect):
         coeff = (val+C)/(val-C)
         diff = coeff-1
 
-        ## Sort points in order of increasing y-value.
-        named = False
-        if len(points[0]) == 3:
-            named = True
-            points = [(x,y,name) for x,y,name in sorted(points,key=lambda a: a[1])]
-        else:
-            points = [(x,y,None) for x,y in sorted(points,key=lambda a: a[1])]
-
-        done = []
-        cur_y = 0
-        for point in points:
-            x,y,name = point
-
-            ## Check constraints
-            if y < cur_y:
+        ## Templates use only a few distinct fractions, remember their rotations
+        rotations = {}
+        def rotation(x):
+            if x not in rotations:
+                c = C*x
+                ## The angle of rotation is determined using cosine law
+                n2 = 1+c**2-2*c*cos((pi-theta)/2)
+                factor = sqrt(n2)
+                phi = acos((n2+1-c**2)/(2*factor))
+                rotations[x] = (cos(phi),sin(phi),factor)
+            return rotations[x]
+        return vectors,coeff,diff,rotation
+
+    def wrap(self,xs,ys,segments,tables=None):
+        """ Wrap a grid around the origin.
+        <<xs>> and <<ys>> are sequences of coordinates.
+            x-values should be within [0,segments)
+                Values not within range will be moved within range.
+            y-values must be greater than 0
+                An error will be raised if a y-value is less than 0.
+        <<segments>> is the number of segments (sides) of the polygon.
+        <<tables>> is the result of wrapTables, to reuse it for many calls.
+        Returns arrays of the wrapped x and y coordinates,
+        or lists when numpy is not available.
+        """
+        vectors,coeff,diff,rotation = tables or self.wrapTables(segments)
+        if numpy is not None:
+            return self.wrapArrays(numpy.asarray(xs,dtype=float),numpy.asarray(ys,dtype=float),
+                                   segments,vectors,coeff,diff,rotation)
+
+        ## Radius factors of the rings, as far as they are used
+        rings = [1.0]
+        wxs = []
+        wys = []
+        for x,y in zip(xs,ys):
+            if y < 0:
                 raise ValueError('Invalid point (%d,%d)' % (x,y))
-            elif y >= cur_y+1:
-                ## Multiply vectors accordingly
-                delta = floor(y-cur_y)
-                vectors = [(coeff**delta)*v for v in vectors]
-                cur_y = floor(y)
-
             ## Wrap x-value to lie in the proper place
-            ## lazy
-            while x < 0:
-                x += segments
-            while x >= segments:
+            x = x % segments
+            if x >= segments:
                 x -= segments
-
-            if self.fuzzyEquality(y,int(y)) and self.fuzzyEquality(x,int(x)):
-                x = int(x)
-                ## Can do it the quick way
-                wx,wy = vectors[x].tuple
-            else:
-                ## Use vector rotation
-                ## Determine nearest vector (counterclockwise)
-                pointer = vectors[floor(x)]
-                ## Scale x and y to be within (0,1)
-                x -= int(x)
-                y -= int(y)
-                c = C*x ## This value is used a lot, cache it
-                ## Now the angle of rotation must be determined using cosine law
-                factor = 1
-                if not self.fuzzyEquality(x,0):
-                    ## x isn't equal to 0, must rotate vector
-                    n2 = 1+c**2-2*c*cos((pi-theta)/2)
-                    factor = sqrt(n2)
-                    phi = acos((n2+1-c**2)/(2*factor))
-                    pointer = pointer.rotate(-phi)
+            k = int(x)
+            ring = int(y)
+            x -= k
+            y -= ring
+            while len(rings) <= ring:
+                rings.append(rings[-1]*coeff)
+            vx,vy = vectors[k]
+            scale = rings[ring]
+            if not self.fuzzyEquality(x,0):
+                ## x isn't equal to 0, rotate the vector clockwise
+                cosphi,sinphi,factor = rotation(x)
+                vx,vy = vx*cosphi+vy*sinphi,vy*cosphi-vx*sinphi
+                scale *= factor
+            if not self.fuzzyEquality(y,0):
                 ## Correct vector magnitude
-                pointer = (1+y*diff)*factor*pointer
-                wx,wy = pointer.tuple
-            if named:
-                done.append((wx,wy,name))
-            else:
-                done.append((wx,wy))
-        return done
+                scale *= 1+y*diff
+            wxs.append(vx*scale)
+            wys.append(vy*scale)
+        return wxs,wys
+
+    def wrapArrays(self,xs,ys,segments,vectors,coeff,diff,rotation):
+        """ Batched version of wrap for numpy arrays."""
+        if len(ys) and ys.min() < 0:
+            i = int(ys.argmin())
+            raise ValueError('Invalid point (%d,%d)' % (xs[i],ys[i]))
+        xs = numpy.mod(xs,segments)
+        xs[xs >= segments] -= segments
+        k = numpy.floor(xs).astype(int)
+        ring = numpy.floor(ys).astype(int)
+        xs = xs-k
+        ys = ys-ring
+        rings = numpy.cumprod(numpy.concatenate(([1.0],numpy.full(int(ring.max()) if len(ring) else 0,coeff))))
+        vectors = numpy.array(vectors)
+        vx = vectors[k,0]
+        vy = vectors[k,1]
+        scale = rings[ring]
+
+        ## One rotation per distinct fraction
+        fractions,index = numpy.unique(xs,return_inverse=True)
+        table = numpy.array([rotation(x) if not self.fuzzyEquality(x,0) else (1.0,0.0,1.0)
+                             for x in fractions.tolist()]).reshape(-1,3)
+        cosphi = table[index,0]
+        sinphi = table[index,1]
+        vx,vy = vx*cosphi+vy*sinphi,vy*cosphi-vx*sinphi
+        scale = scale*table[index,2]
+        scale = numpy.where(ys > 1e-8,scale*(1+ys*diff),scale)
+        return vx*scale,vy*scale
 
     def createGround(self,unit,rows,cols,scale=1):
-        """ Return a lace ground.
+        """ Generate a lace ground.
 
-        This function returns a list of points and corresponding lines that may
-        be transformed or passed to a drawing function (such as draw_image) in
-        order to draw a lace ground.
+        This function generates the cells of a lace ground that may be
+        transformed or passed to a drawing function (such as draw) in order
+        to draw a lace ground. Each cell (x1,y1,x2,y2,x3,y3) stands for the
+        lines from (x1,y1) to (x2,y2) and from (x1,y1) to (x3,y3), the cells
+        are numbered in the order they are generated.
 
         unit is the pattern for the lace ground, in the format returned by
             loadFile.
@@ -308,6 +351,10 @@ class CircularGround(inkex.Effect):
             scaling may be scaled by any integer value above 1 and select values
             between 1 and 0 (namely 0.25,0.5,0.75). A scale value of 'True' may be
             passed if each repeat of the template should fit within a 1x1 square.
+
+        Generates, one column of repeats at a time, the number of the first
+        cell and the flat coordinates of the cells, as a numpy array of
+        shape (n,6) or, without numpy, as an array of 6n doubles.
         """
         data = unit['data']
         unit_rows = unit['rows']
@@ -335,60 +382,154 @@ class CircularGround(inkex.Effect):
                 raise ValueError('Scale factor must result in an integer value for template cols')
             unit_rows = int(unit_rows)
             unit_cols = int(unit_cols)
-        line_num = 0
-        points = []
+        cells = [c for row in data for c in row]
+        first = 0
         for c in range(cols):
             ## Do each column first
             x = c*unit_cols
-            for r in range(rows):
-                y = r*unit_rows
-                for row in data:
-                    for x1,y1,x2,y2,x3,y3 in row:
-                        ## In order to draw lines in the correct order, an extra
-                        ## point must be added
-                        p1 = (x+x1,y+y1,'%09da,1'%line_num)
-                        p2 = (x+x2,y+y2,'%09da,2'%line_num)
-                        p1a = (x+x1,y+y1,'%09db,1'%line_num)
-                        p3 = (x+x3,y+y3,'%09db,3'%line_num)
-                        points.extend([p1,p2,p1a,p3])
-                        line_num += 1
-        return points
-
-    def draw(self, points,line=lambda a: None):
+            if numpy is not None:
+                offsets = numpy.zeros((rows,1,6))
+                offsets[:,:,0::2] = x
+                offsets[:,:,1::2] = (numpy.arange(rows)*unit_rows)[:,None,None]
+                column = (offsets+numpy.array(cells,dtype=float).reshape(1,-1,6)).reshape(-1,6)
+            else:
+                column = array('d')
+                for r in range(rows):
+                    y = r*unit_rows
+                    for x1,y1,x2,y2,x3,y3 in cells:
+                        column.extend((x+x1,y+y1,x+x2,y+y2,x+x3,y+y3))
+            yield first,column
+            first += rows*len(cells)
+
+    def wrapCells(self,cells,segments,tables):
+        """ Wrap the cells of one column of repeats around the origin.
+        Returns the wrapped x and y coordinates, three per cell.
+        """
+        if numpy is not None:
+            return self.wrap(cells[:,0::2].ravel(),cells[:,1::2].ravel(),segments,tables)
+        return self.wrap(cells[0::2],cells[1::2],segments,tables)
+
+    def wedges(self,ground,segments,tables,count=None):
+        """ The wrapped x and y coordinates of the cells, one column of repeats
+        (a wedge of the circle) at a time, at most count wedges.
+        Unless --symmetry is none only the first wedge is wrapped,
+        the others are that wedge rotated around the centre.
+        """
+        if self.options.symmetry == 'none':
+            for first,cells in islice(ground(),count):
+                yield self.wrapCells(cells,segments,tables)
+            return
+        first,cells = next(ground())
+        xs,ys = self.wrapCells(cells,segments,tables)
+        yield xs,ys
+        cols = self.options.cols
+        for c in range(1,cols if count is None else min(count,cols)):
+            ## The columns go clockwise, like the vertices of the polygon
+            phi = -2*pi*c/cols
+            cosphi,sinphi = cos(phi),sin(phi)
+            if numpy is not None:
+                yield xs*cosphi-ys*sinphi,xs*sinphi+ys*cosphi
+            else:
+                yield [x*cosphi-y*sinphi for x,y in zip(xs,ys)],[x*sinphi+y*cosphi for x,y in zip(xs,ys)]
+
+    def clones(self,wedge,cx,cy,lines):
+        """ Place the wedge in the other columns as clones rotated around (cx,cy).
+        lines is the number of lines of the wedge, a draft stops placing
+        clones when they would exceed its budget.
+        """
+        number = self.encoder.number
+        href = '#'+wedge.get('id')
+        for c in range(1,self.options.cols):
+            if self.budget is not None and self.budget.take(lines) < lines:
+                break
+            angle = -360.0*c/self.options.cols
+            ## plain href of SVG 2, xlink:href would declare its namespace on each clone
+            ## when the document has none yet
+            attribs = {'href':href,
+                       'transform':'rotate(%s,%s,%s)' % (number(angle),number(cx),number(cy))}
+            self.addElement(inkex.addNS('use','svg'),attribs)
+
+    def draw(self,ground,segments,line=lambda a: None,flush=lambda: None):
         """ Draw the image.
-        points - a list of points, as returned by createGround.
+        ground - a function that generates the cells of the ground, like createGround.
+        segments - the number of segments of the polygon to wrap the ground around.
         line - a function that draws a line connecting all points in the passed list in order.
+        flush - a function that draws what line collected, before clones refer to it.
         """
-        groups = {}
-        ## This loop scales points, sorts them into groups, and gets image parameters
-        xs = []
-        ys = []
-        for x,y,n in points:
-            xs.append(x)
-            ys.append(y)
-            sn = n.split(',',1)
-            ident = 0
-            if len(sn) == 2:
-                ident = int(sn[1])
-                n = sn[0]
-            if n not in groups:
-                groups[n] = []
-            groups[n].append((x,y,ident))
-        max_x = max(xs)
-        min_x = min(xs)
-        max_y = max(ys)
-        min_y = min(ys)
-        ## Sort all groups to draw lines in order
-        for group in groups:
-            groups[group].sort(key=lambda a:a[2])
-        ## Sort all groups to draw groups in order
-        groups = sorted([(name,pts) for name,pts in groups.items()],key=lambda a:a[0])
-        ## Draw lines
-        for name,pts in groups:
-            _pts = []
-            for p in pts:
-                _pts.append([p[0]-min_x,p[1]-min_y])
-            self.line(_pts)
+        tables = self.wrapTables(segments)
+
+        ## First pass: the bounding box, one column at a time
+        min_x = min_y = float('inf')
+        max_x = max_y = float('-inf')
+        for xs,ys in self.wedges(ground,segments,tables):
+            if len(xs):
+                min_x = min(min_x,float(min(xs)))
+                min_y = min(min_y,float(min(ys)))
+                max_x = max(max_x,float(max(xs)))
+                max_y = max(max_y,float(max(ys)))
+
+        ## Second pass: draw the lines of each cell in order,
+        ## for clones only those of the first wedge, in a group of its own
+        clones = self.options.symmetry == 'use'
+        if clones:
+            attribs = {'id':self.svg.get_unique_id('wedge')}
+            wedge = etree.SubElement(self.layer,inkex.addNS('g','svg'),attribs)
+            layer,stream = self.layer,self.stream
+            self.layer,self.stream = wedge,None
+        lines = 0
+        chained = []
+        if self.export:
+            ## a wedge shares its nodes with the wedges next to it only
+            self.export.remember(2)
+        for xs,ys in self.wedges(ground,segments,tables,1 if clones else None):
+            if numpy is not None:
+                xs = (xs-min_x).tolist()
+                ys = (ys-min_y).tolist()
+            else:
+                xs = [x-min_x for x in xs]
+                ys = [y-min_y for y in ys]
+            cells = len(xs)//3
+            if self.budget is not None:
+                cells = self.budget.take(2*cells)//2
+            if self.profile:
+                self.profile.count('segments',2*cells)
+            lines += 2*cells
+            if self.options.chain:
+                for i in range(0,3*cells,3):
+                    chained.append((xs[i],ys[i],xs[i+1],ys[i+1]))
+                    chained.append((xs[i],ys[i],xs[i+2],ys[i+2]))
+            else:
+                for i in range(0,3*cells,3):
+                    p1 = [xs[i],ys[i]]
+                    line([p1,[xs[i+1],ys[i+1]]])
+                    line([p1,[xs[i+2],ys[i+2]]])
+            if self.export:
+                ## the last wedge meets the first one again
+                self.export.band(keep=lines == 2*cells)
+            if self.budget is not None and not self.budget:
+                break
+
+        ## Lines that meet are drawn as one, for plotters and cutters
+        if self.options.chain:
+            strokes = chain(chained)
+            if self.profile:
+                self.profile.count('strokes',len(strokes))
+            if self.options.report:
+                inkex.errormsg('%d lines chained into %d strokes' % (len(chained),len(strokes)))
+            for points in strokes:
+                line(points)
+        flush()
+        if clones:
+            self.layer,self.stream = layer,stream
+            if self.stream:
+                self.stream.write(wedge)
+            self.clones(wedge,-min_x,-min_y,lines)
+
+        ## A draft shows the rest of the ground as the outline of its bounding box
+        if self.budget is not None and max_x >= min_x:
+            width = max_x-min_x
+            height = max_y-min_y
+            line([[0,0],[width,0],[width,height],[0,height],[0,0]])
 
     def __init__(self):
         inkex.Effect.__init__(self)
@@ -424,19 +565,115 @@ class CircularGround(inkex.Effect):
         self.arg_parser.add_argument('--linecolor',
                                      type=inkex.Color,
                                      dest='linecolor')
+        # Output description
+        self.arg_parser.add_argument('--outputmode',
+                                     type=str,
+                                     dest='outputmode',
+                                     default='paths',
+                                     help='Output: paths (one per line) or compound (one combined path)')
+        self.arg_parser.add_argument('--chunk',
+                                     type=int,
+                                     dest='chunk',
+                                     default=0,
+                                     help='Maximum number of lines per combined path, 0 for no limit')
+        self.arg_parser.add_argument('--symmetry',
+                                     type=str,
+                                     dest='symmetry',
+                                     default='rotate',
+                                     choices=('rotate','use','none'),
+                                     help='Copies around the circle: rotate (the lines of the first copy), '
+                                          'use (clones of the first copy) or none (compute each copy)')
+        self.arg_parser.add_argument('--chain',
+                                     type=inkex.Boolean,
+                                     dest='chain',
+                                     default=False,
+                                     help='Join lines that meet into as few strokes as possible')
+        self.arg_parser.add_argument('--report',
+                                     type=inkex.Boolean,
+                                     dest='report',
+                                     default=False,
+                                     help='Report statistics of the drawing on stderr')
+        self.arg_parser.add_argument('--export',
+                                     type=str,
+                                     dest='export',
+                                     default='',
+                                     help='Write the nodes and lines to files for other tools instead of drawing them')
+        self.arg_parser.add_argument('--exportformat',
+                                     type=str,
+                                     dest='exportformat',
+                                     default='auto',
+                                     choices=('auto',)+EXPORT_FORMATS,
+                                     help='Format of the export: csv, jsonl, bin or auto (by the extension of the file)')
+        self.arg_parser.add_argument('--stream',
+                                     type=inkex.Boolean,
+                                     dest='stream',
+                                     default=False,
+                                     help='Write the generated elements straight to the output file')
+        self.arg_parser.add_argument('--precision',
+                                     type=int,
+                                     dest='precision',
+                                     default=3,
+                                     help='Decimals of the coordinates in the path data, -1 for all')
+        self.arg_parser.add_argument('--replace',
+                                     type=inkex.Boolean,
+                                     dest='replace',
+                                     default=True,
+                                     help='Replace the ground generated before, the selected one or the last one in the layer')
+        self.arg_parser.add_argument('--preview',
+                                     type=inkex.Boolean,
+                                     dest='preview',
+                                     default=False,
+                                     help='Draw a draft: the first lines and the outline of the ground')
+        self.arg_parser.add_argument('--budget',
+                                     type=int,
+                                     dest='budget',
+                                     default=2000,
+                                     help='Maximum number of lines of a draft')
+        self.arg_parser.add_argument('--profile',
+                                     type=str,
+                                     dest='profile',
+                                     default='',
+                                     help='Write timings and counts as JSON to this file, - for stderr')
+        self.stream = None
+        self.export = None
+        self.budget = None
+        self.profile = lace_profile.NULL
 
     def effect(self):
         ## Load the file
-        unit = self.loadFile()
+        with self.profile.phase('template'):
+            unit = self.loadFile()
+        self.budget = draftBudget(self.options)
+        params = parameters(self.options)
+        old = findGenerated(self.svg,'circular') if self.options.replace else None
         self.options.linecolor = self.options.linecolor.to_rgb()
 
         ## Change the input to universal units
-        self.options.diameter = self.unitToUu(str(self.options.diameter)+self.options.diamunits)
-        self.options.linewidth = self.unitToUu(str(self.options.linewidth)+self.options.lineunits)
+        with self.profile.phase('units'):
+            self.options.diameter = self.unitToUu(str(self.options.diameter)+self.options.diamunits)
+            self.options.linewidth = self.unitToUu(str(self.options.linewidth)+self.options.lineunits)
         
         ## Convert the angle
         self.options.angle = radians(self.options.angle)
 
+        ## Only the nodes and lines for other tools, clones are for drawings
+        if self.options.export:
+            self.budget = None
+            old = None
+            self.options.symmetry = 'rotate' if self.options.symmetry == 'use' else self.options.symmetry
+            ## chained strokes would come out of wedge order and outlive the node memory
+            self.options.chain = False
+            self.export = GeometryExport(self.options.export,self.options.exportformat,
+                                         self.unitToUu('1'+self.options.diamunits),self.options.precision)
+
+        ## A ground with the same geometry only needs the new style
+        self.style = self.lineStyle()
+        if old is not None and changedParameters(old,params).issubset(self.STYLE):
+            restyle(old,lambda style: self.style,params)
+            return
+        self.layer = None if self.export else outputGroup(self.svg,'circular',params,old,self.style)
+        self.encoder = PathEncoder(self.options.precision)
+
         ## Ensure no y-values are below 0
         min_y = min([b for a in [i[1::2] for row in unit['data'] for i in row] for b in a]) 
         if min_y < 0:
@@ -448,14 +685,60 @@ class CircularGround(inkex.Effect):
                 data.append(_row)
             unit['data'] = data
 
-        ## Create the ground coordinates
-        points = self.createGround(unit,self.options.rows,self.options.cols)
+        ## Create the ground coordinates, wrapped around a polygon while drawing
+        ground = lambda: self.createGround(unit,self.options.rows,self.options.cols)
+        segments = self.options.cols*unit['cols']
 
-        ## Wrap it around a polygon
-        points = self.circleWrap(points,self.options.cols*unit['cols'])
+        if self.export:
+            with self.profile.phase('geometry'):
+                self.draw(ground,segments,line=lambda points: self.export.polyline([a[:2] for a in points]))
+            self.export.close()
+            self.profile.count('nodes',self.export.points)
+            self.profile.count('edges',self.export.edges)
+            return
 
         ## Draw everything
-        self.draw(points,line=lambda a: self.line(a))
-
-effect = CircularGround()
-effect.run()
+        if self.options.stream:
+            self.stream = SvgStream(self.svg,self.layer,self.options.output)
+        self.profile.instrument(self,'path','elements')
+        self.profile.instrument(self,'addElement','elements','elements')
+        with self.profile.phase('geometry'):
+            if self.options.outputmode == 'compound':
+                motions = []
+                def flush():
+                    self.compound(motions)
+                    del motions[:]
+                    self.encoder.reset()
+                def add(points):
+                    motions.append(self.motions(points))
+                    if len(motions) == self.options.chunk:
+                        flush()
+                self.draw(ground,segments,line=add,flush=flush)
+                flush()
+            else:
+                self.draw(ground,segments,line=lambda a: self.line(a))
+        if self.stream:
+            self.stream.close()
+
+    def has_changed(self,ret):
+        """ A streamed document is written already."""
+        if self.stream:
+            return False
+        return inkex.Effect.has_changed(self,ret)
+
+    def load_raw(self):
+        """ Read the document, timed when profiling."""
+        self.profile = lace_profile.create('circular',self.options.profile)
+        with self.profile.phase('load'):
+            inkex.Effect.load_raw(self)
+
+    def save_raw(self,ret):
+        """ Write the document and the profile report."""
+        with self.profile.phase('save'):
+            inkex.Effect.save_raw(self,ret)
+        if self.profile:
+            self.profile.count('bytes',self.stream.bytes if self.stream else lace_profile.outputSize(self.options.output))
+            self.profile.write()
+
+if __name__ == '__main__':
+    CircularGround().run()
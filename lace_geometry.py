@@ -0,0 +1,670 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2026, the inkscape-bobbinlace contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Geometry stages shared by the grid and ground extensions.
+"""
+
+import os
+from math import hypot, sqrt
+from collections import deque
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__license__ = 'Simplified BSD'
+__version__ = '__VERSION__'
+
+MASK = 0xFFFFFFFFFFFFFFFF
+# lattice positions per grid unit, templates may use fractions of a grid unit
+RESOLUTION = 1000
+# relative tolerance for points on the border of a rectangle
+EPSILON = 1e-9
+
+
+def mix(z):
+    """
+    splitmix64 finalizer: scramble a 64 bit integer.
+    Works on python ints and on numpy uint64 arrays alike.
+    """
+    if numpy is not None and isinstance(z, numpy.ndarray):
+        z = z + numpy.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+        return z ^ (z >> numpy.uint64(31))
+    z = (z + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+class Jitter(object):
+    """
+    Random nudges of lattice nodes.
+
+    The nudge of a node only depends on the seed and on the integer lattice
+    coordinates of the node. Nodes shared by several segments or repeats
+    therefore move together, without remembering earlier nudges, and a run
+    with the same seed gives the same result in any order.
+    Nudged nodes start from their exact lattice position, so rounding
+    differences between repeats don't separate shared nodes.
+    """
+
+    def __init__(self, xrange, yrange, unitX, unitY, seed=0):
+        """
+        xrange and yrange are the maximum nudges, unitX and unitY the
+        distances between lattice nodes. A seed of 0 picks a random seed.
+        """
+        self.xrange = xrange
+        self.yrange = yrange
+        self.unitX = unitX
+        self.unitY = unitY
+        self.seed = seed or int.from_bytes(os.urandom(4), 'little')
+        self.base = mix(self.seed)
+
+    def __bool__(self):
+        return self.xrange != 0 or self.yrange != 0
+
+    def key(self, x, y):
+        """
+        Integer lattice coordinates of the point (x, y).
+        """
+        return int(round(x / self.unitX * RESOLUTION)), int(round(y / self.unitY * RESOLUTION))
+
+    def uniform(self, kx, ky, axis):
+        """
+        Number in [-1, 1) for one axis of the node with lattice coordinates (kx, ky).
+        """
+        h = mix(self.base ^ mix((kx * 0xC2B2AE3D27D4EB4F + ky * 0x165667B19E3779F9 + axis) & MASK))
+        return 2.0 * (h >> 11) * 2.0**-53 - 1.0
+
+    def point(self, x, y):
+        """
+        Nudged position of the point (x, y).
+        """
+        kx, ky = self.key(x, y)
+        return [kx * self.unitX / RESOLUTION + self.xrange * self.uniform(kx, ky, 0),
+                ky * self.unitY / RESOLUTION + self.yrange * self.uniform(kx, ky, 1)]
+
+    def points(self, xs, ys):
+        """
+        Nudged positions of many points at once.
+        Returns lists of x and y values.
+        """
+        if numpy is None:
+            nudged = [self.point(x, y) for x, y in zip(xs, ys)]
+            return [p[0] for p in nudged], [p[1] for p in nudged]
+        xs, ys = self.arrays(xs, ys)
+        return xs.tolist(), ys.tolist()
+
+    def arrays(self, xs, ys):
+        """
+        Nudged positions of many points at once, as numpy arrays.
+        """
+        kx = numpy.rint(numpy.asarray(xs, dtype=float) / self.unitX * RESOLUTION).astype(numpy.int64)
+        ky = numpy.rint(numpy.asarray(ys, dtype=float) / self.unitY * RESOLUTION).astype(numpy.int64)
+        xs = kx.astype(float) * self.unitX / RESOLUTION
+        ys = ky.astype(float) * self.unitY / RESOLUTION
+        node = (kx.astype(numpy.uint64) * numpy.uint64(0xC2B2AE3D27D4EB4F) +
+                ky.astype(numpy.uint64) * numpy.uint64(0x165667B19E3779F9))
+        base = numpy.uint64(self.base)
+        ux = mix(base ^ mix(node))
+        uy = mix(base ^ mix(node + numpy.uint64(1)))
+        ux = 2.0 * (ux >> numpy.uint64(11)).astype(float) * 2.0**-53 - 1.0
+        uy = 2.0 * (uy >> numpy.uint64(11)).astype(float) * 2.0**-53 - 1.0
+        return xs + self.xrange * ux, ys + self.yrange * uy
+
+    def segments(self, segments):
+        """
+        Nudge both ends of segments (x1, y1, x2, y2).
+        Returns a list of segments.
+        """
+        if numpy is None:
+            nudged = []
+            for x1, y1, x2, y2 in segments:
+                nudged.append(self.point(x1, y1) + self.point(x2, y2))
+            return nudged
+        coords = numpy.asarray(segments, dtype=float).reshape(-1, 4)
+        xs, ys = self.arrays(coords[:, 0::2].ravel(), coords[:, 1::2].ravel())
+        coords[:, 0::2] = xs.reshape(-1, 2)
+        coords[:, 1::2] = ys.reshape(-1, 2)
+        return coords.tolist()
+
+
+class EdgeSet(object):
+    """
+    Drop segments that were generated before.
+
+    Template cells refer to nodes of the neighbouring repeats, so the
+    segments along the seams of the repeats come twice, once from each
+    side. Segments are compared by the lattice coordinates of their end
+    points, regardless of direction.
+    The segments arrive in bands, one row of repeats at a time. A segment
+    can only come back within the next few bands, so only the segments of
+    the last `window` bands are remembered.
+    """
+
+    def __init__(self, unitX, unitY, window=None):
+        """
+        unitX and unitY are the distances between lattice nodes,
+        window the number of earlier bands that can repeat a segment,
+        None to remember all segments.
+        """
+        self.unitX = unitX
+        self.unitY = unitY
+        self.bands = deque(maxlen=window)
+        self.removed = 0
+
+    def keys(self, segments):
+        """
+        Direction independent lattice keys of segments (x1, y1, x2, y2).
+        """
+        if numpy is None:
+            keys = []
+            for x1, y1, x2, y2 in segments:
+                p = (int(round(x1 / self.unitX * RESOLUTION)), int(round(y1 / self.unitY * RESOLUTION)))
+                q = (int(round(x2 / self.unitX * RESOLUTION)), int(round(y2 / self.unitY * RESOLUTION)))
+                keys.append((p, q) if p <= q else (q, p))
+            return keys
+        coords = numpy.asarray(segments, dtype=float).reshape(-1, 4)
+        kx = numpy.rint(coords[:, 0::2] / self.unitX * RESOLUTION).astype(numpy.int64)
+        ky = numpy.rint(coords[:, 1::2] / self.unitY * RESOLUTION).astype(numpy.int64)
+        # one number per node, ordered like the (x, y) tuples above
+        nodes = (kx << 32) + ky
+        lo = nodes.min(axis=1)
+        hi = nodes.max(axis=1)
+        return list(zip(lo.tolist(), hi.tolist()))
+
+    def unique(self, segments):
+        """
+        The segments of one band that were not seen before, in their original order.
+        """
+        keys = self.keys(segments)
+        band = set(keys)
+        fresh = band.difference(*self.bands)
+        self.bands.append(band)
+        if len(fresh) == len(keys):
+            # nothing to remove, the usual case for well formed templates
+            return segments
+        kept = []
+        for segment, key in zip(segments, keys):
+            if key in fresh:
+                fresh.remove(key)
+                kept.append(segment)
+        self.removed += len(segments) - len(kept)
+        return kept
+
+
+class Rectangle(object):
+    """
+    The area of a patch.
+
+    Points on the border count as inside, with a small tolerance so that
+    rounding errors don't drop the nodes on the border of the patch.
+    """
+
+    def __init__(self, width, height, margin=0):
+        """
+        A rectangle from (0, 0) to (width, height).
+        margin widens the area for tests of bounding boxes, to allow for nudges.
+        """
+        self.width = width
+        self.height = height
+        tolerance = EPSILON * max(width, height, 1)
+        # a segment leaving a node on the border crosses the tolerance band
+        # in a stub a little longer than the tolerance, the flatter the longer
+        self.shortest = 100 * tolerance
+        self.left = -tolerance
+        self.top = -tolerance
+        self.right = width + tolerance
+        self.bottom = height + tolerance
+        self.margin = margin
+
+    def overlaps(self, left, top, right, bottom):
+        """
+        True when the bounding box touches the area widened by the margin.
+        """
+        return (left <= self.right + self.margin and right >= self.left - self.margin and
+                top <= self.bottom + self.margin and bottom >= self.top - self.margin)
+
+    def points(self, xs, ys):
+        """
+        The points inside the area, as lists of x and y values.
+        """
+        inside = [(x, y) for x, y in zip(xs, ys)
+                  if self.left <= x <= self.right and self.top <= y <= self.bottom]
+        return [p[0] for p in inside], [p[1] for p in inside]
+
+    def clip(self, x1, y1, x2, y2):
+        """
+        The part of one segment inside the area, None when there is none.
+        """
+        dx = x2 - x1
+        dy = y2 - y1
+        t0 = 0.0
+        t1 = 1.0
+        # Liang-Barsky: clip the parameter range against each border
+        for p, q in ((-dx, x1 - self.left), (dx, self.right - x1),
+                     (-dy, y1 - self.top), (dy, self.bottom - y1)):
+            if p == 0:
+                if q < 0:
+                    return None
+            elif p < 0:
+                t0 = max(t0, q / p)
+            else:
+                t1 = min(t1, q / p)
+        if t0 > t1 or ((dx or dy) and (t1 - t0) * hypot(dx, dy) <= self.shortest):
+            return None
+        # keep the original end points when they are inside,
+        # put the cut ends exactly on the border
+        start = self.clamp(x1 + t0 * dx, y1 + t0 * dy) if t0 > 0 else (x1, y1)
+        end = self.clamp(x1 + t1 * dx, y1 + t1 * dy) if t1 < 1 else (x2, y2)
+        return [start[0], start[1], end[0], end[1]]
+
+    def clamp(self, x, y):
+        """
+        The nearest point inside the exact area.
+        """
+        return min(max(x, 0.0), self.width), min(max(y, 0.0), self.height)
+
+    def segments(self, segments):
+        """
+        The parts of the segments (x1, y1, x2, y2) inside the area.
+        Segments outside are dropped, segments crossing the border are cut.
+        Returns a list of segments.
+        """
+        if numpy is None:
+            clipped = []
+            for segment in segments:
+                segment = self.clip(*segment)
+                if segment is not None:
+                    clipped.append(segment)
+            return clipped
+        coords = numpy.asarray(segments, dtype=float).reshape(-1, 4)
+        x1, y1, x2, y2 = coords.T
+        dx = x2 - x1
+        dy = y2 - y1
+        t0 = numpy.zeros(len(coords))
+        t1 = numpy.ones(len(coords))
+        keep = numpy.ones(len(coords), dtype=bool)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for p, q in ((-dx, x1 - self.left), (dx, self.right - x1),
+                         (-dy, y1 - self.top), (dy, self.bottom - y1)):
+                keep &= (p != 0) | (q >= 0)
+                t = q / p
+                t0 = numpy.where(p < 0, numpy.maximum(t0, t), t0)
+                t1 = numpy.where(p > 0, numpy.minimum(t1, t), t1)
+        keep &= ((t1 - t0) * numpy.hypot(dx, dy) > self.shortest) | ((t0 <= t1) & (dx == 0) & (dy == 0))
+        # keep the original end points when they are inside,
+        # put the cut ends exactly on the border
+        cutX1 = numpy.clip(x1 + t0 * dx, 0.0, self.width)
+        cutY1 = numpy.clip(y1 + t0 * dy, 0.0, self.height)
+        cutX2 = numpy.clip(x1 + t1 * dx, 0.0, self.width)
+        cutY2 = numpy.clip(y1 + t1 * dy, 0.0, self.height)
+        coords = numpy.stack([numpy.where(t0 > 0, cutX1, x1),
+                              numpy.where(t0 > 0, cutY1, y1),
+                              numpy.where(t1 < 1, cutX2, x2),
+                              numpy.where(t1 < 1, cutY2, y2)], axis=1)
+        return coords[keep].tolist()
+
+
+def chain(segments, tolerance=1e-6):
+    """
+    Join segments (x1, y1, x2, y2) into as few polylines as possible.
+
+    End points closer than about tolerance are the same node. Each
+    connected part of the graph becomes one closed walk over all its
+    edges, or when it has nodes with an odd number of edges, half as many
+    walks as there are such nodes, which is the minimum. The walks are
+    found like Hierholzer's Euler circuit after pairing the odd nodes with
+    extra edges, the walks end where the circuit takes an extra edge.
+    Returns a list of polylines, each a list of (x, y) points.
+    """
+    # the nodes, numbered in order of appearance
+    numbers = {}
+    points = []
+    ends = []
+    for x1, y1, x2, y2 in segments:
+        pair = []
+        for x, y in ((x1, y1), (x2, y2)):
+            key = (int(round(x / tolerance)), int(round(y / tolerance)))
+            if key not in numbers:
+                numbers[key] = len(points)
+                points.append((x, y))
+            pair.append(numbers[key])
+        ends.append(pair)
+
+    # edges as pairs of node numbers, the extra edges follow the segments
+    incident = [[] for p in points]
+    for edge, (a, b) in enumerate(ends):
+        incident[a].append(edge)
+        incident[b].append(edge)
+    real = len(ends)
+    odd = [node for node, edges in enumerate(incident) if len(edges) % 2]
+    for a, b in zip(odd[0::2], odd[1::2]):
+        incident[a].append(len(ends))
+        incident[b].append(len(ends))
+        ends.append([a, b])
+
+    used = [False] * len(ends)
+    position = [0] * len(points)
+    polylines = []
+    for start in range(len(points)):
+        if position[start] == len(incident[start]):
+            continue
+        # Hierholzer: follow unused edges, backtrack when stuck,
+        # the edges are completed in reverse order of the circuit
+        circuit = []
+        stack = [(start, None)]
+        while stack:
+            node, arrival = stack[-1]
+            edges = incident[node]
+            while position[node] < len(edges) and used[edges[position[node]]]:
+                position[node] += 1
+            if position[node] < len(edges):
+                edge = edges[position[node]]
+                used[edge] = True
+                a, b = ends[edge]
+                stack.append((b if a == node else a, edge))
+            else:
+                stack.pop()
+                if arrival is not None:
+                    circuit.append((node, arrival))
+        if not circuit:
+            continue
+        circuit.reverse()
+
+        # a circuit with extra edges starts right after one of them
+        extra = [i for i, (node, edge) in enumerate(circuit) if edge >= real]
+        if extra:
+            circuit = circuit[extra[0]+1:] + circuit[:extra[0]+1]
+            begin = circuit[-1][0]
+        else:
+            begin = start
+        polyline = [points[begin]]
+        for node, edge in circuit:
+            if edge >= real:
+                if len(polyline) > 1:
+                    polylines.append(polyline)
+                polyline = [points[node]]
+            else:
+                polyline.append(points[node])
+        if len(polyline) > 1:
+            polylines.append(polyline)
+    return polylines
+
+
+# ways to order pins for a pricking machine, from fast to short
+ORDERS = ('none', 'curve', 'nearest', 'twoopt')
+
+
+def travel(xs, ys):
+    """
+    Length of the path from point to point in the given order.
+    """
+    return sum(hypot(xs[i+1] - xs[i], ys[i+1] - ys[i]) for i in range(len(xs) - 1))
+
+
+def curveOrder(xs, ys, bits=16):
+    """
+    Order of the points along a Hilbert curve over their bounding square.
+    Nearby points get nearby numbers, so the path takes short steps
+    most of the time. Takes n log n time.
+    """
+    if len(xs) < 3:
+        return list(range(len(xs)))
+    left = min(xs)
+    top = min(ys)
+    span = max(max(xs) - left, max(ys) - top) or 1.0
+    side = 1 << bits
+    scale = (side - 1) / span
+    if numpy is not None:
+        x = ((numpy.asarray(xs, dtype=float) - left) * scale).astype(numpy.int64)
+        y = ((numpy.asarray(ys, dtype=float) - top) * scale).astype(numpy.int64)
+        d = numpy.zeros(len(xs), dtype=numpy.int64)
+        s = side >> 1
+        while s:
+            rx = (x & s) > 0
+            ry = (y & s) > 0
+            d += s * s * ((3 * rx) ^ ry)
+            # rotate the quadrant so the curve inside it starts and ends right
+            flip = ~ry & rx
+            x = numpy.where(flip, side - 1 - x, x)
+            y = numpy.where(flip, side - 1 - y, y)
+            x, y = numpy.where(ry, x, y), numpy.where(ry, y, x)
+            s >>= 1
+        return numpy.argsort(d, kind='stable').tolist()
+    keys = []
+    for px, py in zip(xs, ys):
+        x = int((px - left) * scale)
+        y = int((py - top) * scale)
+        d = 0
+        s = side >> 1
+        while s:
+            rx = 1 if x & s else 0
+            ry = 1 if y & s else 0
+            d += s * s * ((3 * rx) ^ ry)
+            if not ry:
+                if rx:
+                    x = side - 1 - x
+                    y = side - 1 - y
+                x, y = y, x
+            s >>= 1
+        keys.append(d)
+    return sorted(range(len(xs)), key=keys.__getitem__)
+
+
+def nearestOrder(xs, ys):
+    """
+    Order of the points when each step goes to the nearest point not
+    visited yet, starting with the first point. The points are kept in a
+    grid of cells with about one point each, so a step only looks at the
+    cells around the current point, until few cells are left.
+    """
+    n = len(xs)
+    if n < 3:
+        return list(range(n))
+    left = min(xs)
+    top = min(ys)
+    area = (max(xs) - left) * (max(ys) - top)
+    size = sqrt(area / n) if area else (max(max(xs) - left, max(ys) - top) / n or 1.0)
+    cells = {}
+    for i in range(n):
+        cells.setdefault((int((xs[i] - left) / size), int((ys[i] - top) / size)), []).append(i)
+
+    def remove(i):
+        key = (int((xs[i] - left) / size), int((ys[i] - top) / size))
+        cell = cells[key]
+        cell.remove(i)
+        if not cell:
+            del cells[key]
+
+    current = 0
+    remove(current)
+    order = [current]
+    while cells:
+        x = xs[current]
+        y = ys[current]
+        cx = int((x - left) / size)
+        cy = int((y - top) / size)
+        best = None
+        nearest = float('inf')
+        r = 0
+        while True:
+            # scanning what is left is cheaper than a ring with more cells
+            everything = 8 * r >= len(cells)
+            if everything:
+                keys = list(cells)
+            elif r:
+                keys = [(cx + i, cy + j) for i in range(-r, r + 1) for j in (-r, r)]
+                keys += [(cx + i, cy + j) for i in (-r, r) for j in range(-r + 1, r)]
+            else:
+                keys = [(cx, cy)]
+            for key in keys:
+                for i in cells.get(key, ()):
+                    d = (xs[i] - x) ** 2 + (ys[i] - y) ** 2
+                    if d < nearest:
+                        nearest = d
+                        best = i
+            # points beyond this ring are at least r cells away
+            if everything or (best is not None and nearest <= (r * size) ** 2):
+                break
+            r += 1
+        remove(best)
+        order.append(best)
+        current = best
+    return order
+
+
+def twoOptOrder(xs, ys, order, window=30, passes=2):
+    """
+    Improve an order by reversing stretches of at most window points
+    where that makes the path shorter, the 2-opt move limited to nearby
+    positions in the order. Takes n * window time per pass.
+    """
+    n = len(order)
+    if n < 4:
+        return list(order)
+    order = list(order)
+    for p in range(passes):
+        improved = False
+        for i in range(n - 2):
+            a = order[i]
+            b = order[i + 1]
+            ab = hypot(xs[b] - xs[a], ys[b] - ys[a])
+            best = 1e-9
+            choice = None
+            for j in range(i + 2, min(i + window, n)):
+                c = order[j]
+                # a-b ... c-d becomes a-c ... b-d, the end of the path has no d
+                gain = ab - hypot(xs[c] - xs[a], ys[c] - ys[a])
+                if j + 1 < n:
+                    d = order[j + 1]
+                    gain += hypot(xs[d] - xs[c], ys[d] - ys[c]) - hypot(xs[d] - xs[b], ys[d] - ys[b])
+                if gain > best:
+                    best = gain
+                    choice = j
+            if choice is not None:
+                order[i + 1:choice + 1] = order[i + 1:choice + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def pinOrder(xs, ys, method):
+    """
+    The order to visit the points in, a list of indexes.
+    method is one of ORDERS: none keeps the order, curve is fast,
+    nearest gives shorter paths for scattered points and twoopt the
+    shortest, for the most time.
+    """
+    if method == 'curve':
+        return curveOrder(xs, ys)
+    if method == 'nearest':
+        return nearestOrder(xs, ys)
+    if method == 'twoopt':
+        # start from the shorter of the other two
+        orders = [curveOrder(xs, ys), nearestOrder(xs, ys)]
+        order = min(orders, key=lambda o: travel([xs[i] for i in o], [ys[i] for i in o]))
+        return twoOptOrder(xs, ys, order)
+    if method != 'none':
+        raise ValueError('Unknown order: %s' % method)
+    return list(range(len(xs)))
+
+
+
+def closePairs(xs, ys, threshold):
+    """
+    The pairs (i, j) of indexes of points closer than the threshold, i < j.
+
+    The points are hashed into square cells as wide as the threshold, so a
+    point can only be close to the points in its own cell and the eight
+    cells around it. That takes linear time (n log n with numpy, which
+    sorts the cells) unless many points crowd into a few cells.
+    """
+    n = len(xs)
+    if threshold <= 0 or n < 2:
+        return []
+    if numpy is not None:
+        return closePairsArray(numpy.asarray(xs, dtype=float), numpy.asarray(ys, dtype=float), threshold)
+    limit = threshold * threshold
+    cells = {}
+    for j in range(n):
+        cells.setdefault((int(xs[j] // threshold), int(ys[j] // threshold)), []).append(j)
+    pairs = []
+    for (cx, cy), cell in cells.items():
+        # own cell and the cells after it, each pair of cells once
+        for key in ((cx, cy), (cx+1, cy), (cx-1, cy+1), (cx, cy+1), (cx+1, cy+1)):
+            other = cells.get(key)
+            if other is None:
+                continue
+            same = other is cell
+            for a, i in enumerate(cell):
+                x = xs[i]
+                y = ys[i]
+                for j in (cell[a+1:] if same else other):
+                    if (xs[j] - x) ** 2 + (ys[j] - y) ** 2 < limit:
+                        pairs.append((i, j) if i < j else (j, i))
+    return pairs
+
+
+def closePairsArray(xs, ys, threshold):
+    """
+    closePairs for numpy arrays: the cells are sorted once, the points of
+    a neighbouring cell are found by binary search.
+    """
+    cx = numpy.floor(xs / threshold).astype(numpy.int64)
+    cy = numpy.floor(ys / threshold).astype(numpy.int64)
+    # one number per cell, rows of cells 2**32 apart
+    keys = (cy << 32) + cx
+    order = numpy.argsort(keys, kind='stable')
+    keys = keys[order]
+    positions = numpy.arange(len(keys))
+    limit = threshold * threshold
+    pairs = []
+    # own cell and the cells after it, each pair of cells once
+    for dx, dy in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):
+        target = keys + (dy << 32) + dx
+        if dx == dy == 0:
+            lo = positions + 1
+        else:
+            lo = numpy.searchsorted(keys, target, 'left')
+        hi = numpy.searchsorted(keys, target, 'right')
+        counts = numpy.maximum(hi - lo, 0)
+        total = int(counts.sum())
+        if not total:
+            continue
+        a = numpy.repeat(positions, counts)
+        b = numpy.repeat(lo - numpy.cumsum(counts) + counts, counts) + numpy.arange(total)
+        i = order[a]
+        j = order[b]
+        close = (xs[i] - xs[j]) ** 2 + (ys[i] - ys[j]) ** 2 < limit
+        i = i[close]
+        j = j[close]
+        pairs.extend(zip(numpy.minimum(i, j).tolist(), numpy.maximum(i, j).tolist()))
+    return pairs
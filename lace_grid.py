@@ -23,10 +23,14 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-from math import sin, cos, radians, ceil
+from math import sin, cos, radians, ceil, hypot
 import inkex
 from lxml import etree
-from random import random
+from lace_output import SvgStream, parameters, findGenerated, changedParameters, outputGroup, restyle
+from lace_output import draftBudget, rectangle, PathEncoder, GeometryExport, EXPORT_FORMATS
+from lace_output import OVERLAPS, overlapOverlay
+from lace_geometry import Jitter, Rectangle, ORDERS, pinOrder, travel, closePairs
+import lace_profile
 
 __author__ = 'Veronika Irvine'
 __credits__ = ['Ben Connors', 'Veronika Irvine', 'Mark Shafer']
@@ -38,6 +42,9 @@ class LaceGrid(inkex.Effect):
     Create a grid for lace with angle as specified
     """
 
+    # options that only change the style of the dots
+    STYLE = ('dotcolor',)
+
     def unitToUu(self,param):
         """ Convert units.
         Converts a number in some units into the units used internally by 
@@ -55,37 +62,91 @@ class LaceGrid(inkex.Effect):
         except:
             return inkex.unittouu(param)
 
-    def circle(self, x, y, r, fill):
+    def circle(self, x, y, r):
         """
         Draw a circle of radius 'r' and origin at (x, y)
+        with the fill of the generated group
         """
         
-        # define the stroke style
-        s = {'fill': fill}
-     
-        # create attributes from style and define path
-        attribs = {'style':str(inkex.Style(s)), 
-                    'cx':str(x),
-                    'cy':str(y),
-                    'r':str(r)}
+        # create attributes from the rounded position and radius
+        number = self.encoder.number
+        attribs = {'cx':number(x),
+                    'cy':number(y),
+                    'r':number(r)}
         
-        # insert path object into current layer
-        etree.SubElement(self.svg.get_current_layer(), inkex.addNS('circle', 'svg'), attribs)
+        # insert path object into the generated group
+        self.addElement(inkex.addNS('circle', 'svg'), attribs)
+
+    def addElement(self, tag, attribs):
+        """
+        Insert a new element into the generated group,
+        or write it straight to the output when streaming.
+        """
+        if self.stream:
+            self.stream.add(tag, attribs)
+        else:
+            etree.SubElement(self.layer, tag, attribs)
 
     def drawDot(self, x, y):
-        self.circle(x, y, self.options.dotwidth, self.options.dotcolor)
-
-    def jitter(self, nodeJitter, x, y):
-        if self.options.xrand == 0 and self.options.yrand == 0:
-            return [x,y]
-        id = "%.3f" % x +",%.3f" % y
-        value = nodeJitter.get(id)
-        if not value:
-            jitx = x + self.options.xrand*(2.0*random()-1.0)*self.options.spacing/100
-            jity = y + self.options.yrand*(2.0*random()-1.0)*self.options.spacing/100
-            value = [jitx,jity]
-            nodeJitter[id] = value
-        return value
+        self.circle(x, y, self.options.dotwidth)
+
+    def dotMotions(self, x, y):
+        """
+        Path motions for a dot of radius --dotwidth and origin at (x, y),
+        drawn as two half arcs
+        """
+        r = self.options.dotwidth
+        encoder = self.encoder
+        return encoder.moveTo(x+r, y) + encoder.arcTo(r, 1, 0, x-r, y) + encoder.arcTo(r, 1, 0, x+r, y) + encoder.close()
+
+    def compound(self, motions):
+        """
+        Draw a list of dot motions as one compound path,
+        or as chunks of at most --chunk dots.
+        """
+        size = self.options.chunk or len(motions) or 1
+        for i in range(0, len(motions), size):
+            attribs = {'d':''.join(motions[i:i+size])}
+            self.addElement(inkex.addNS('path', 'svg'), attribs)
+
+    def dots(self, xs, ys, motions):
+        """
+        Draw dots in the given order: circles of their own,
+        or subpaths collected in motions for a compound path.
+        Adds the distance from dot to dot to self.travel.
+        """
+        if self.travel is not None and len(xs):
+            start = self.last or (xs[0], ys[0])
+            self.travel += travel([start[0]] + list(xs), [start[1]] + list(ys))
+            self.last = (xs[-1], ys[-1])
+        if self.pins is not None:
+            self.pins[0].extend(xs)
+            self.pins[1].extend(ys)
+        if self.export:
+            self.export.pins(xs, ys)
+            return
+        for x1, y1 in zip(xs, ys):
+            if self.options.outputmode == 'compound':
+                motions.append(self.dotMotions(x1, y1))
+                if len(motions) == self.options.chunk:
+                    self.compound(motions)
+                    del motions[:]
+                    self.encoder.reset()
+            else:
+                self.drawDot(x1, y1)
+
+    def dotStyle(self):
+        """
+        Style of the dots, shared through the generated group
+        """
+        return str(inkex.Style({'fill': self.options.dotcolor}))
+
+    def outlineStyle(self):
+        """
+        Style of the outline of a draft
+        """
+        s = {'fill': 'none', 'stroke': self.options.dotcolor, 'stroke-width': self.options.dotwidth/2}
+        return str(inkex.Style(s))
 
     def draw(self):
         
@@ -98,19 +159,59 @@ class LaceGrid(inkex.Effect):
         cols = int(ceil(self.options.width  / hgrid))
         y = 0.0
 
-        nodeJitter = {}
+        # Random jitter of dots, keyed on their position in the grid
+        jitter = Jitter(self.options.xrand*a/100, self.options.yrand*a/100, hgrid, vgrid, self.options.seed)
+        patch = Rectangle(self.options.width, self.options.height)
+        motions = []
+        # an order other than row by row needs all dots first
+        collect = self.options.order != 'none'
+        allX = []
+        allY = []
         
         for r in range(rows):
             x = 0.0
             if (r % 2 == 1):
                 x += hgrid
             
+            xs = []
             for c in range(ceil(cols/2)):
-                x1,y1 = self.jitter(nodeJitter,x,y)
-                self.drawDot(x1, y1)
+                xs.append(x)
                 x += 2.0*hgrid;
+            ys = [y] * len(xs)
+            if jitter:
+                xs, ys = jitter.points(xs, ys)
+            if self.options.clip:
+                xs, ys = patch.points(xs, ys)
+            if self.budget is not None:
+                n = self.budget.take(len(xs))
+                xs, ys = xs[:n], ys[:n]
+            if self.profile:
+                self.profile.count('pins', len(xs))
+
+            if collect:
+                allX.extend(xs)
+                allY.extend(ys)
+            else:
+                self.dots(xs, ys, motions)
                 
             y += vgrid;
+            if self.budget is not None and not self.budget:
+                break
+
+        # Pins in an order with little travel for a pricking machine
+        if collect:
+            with self.profile.phase('order'):
+                order = pinOrder(allX, allY, self.options.order)
+            self.dots([allX[i] for i in order], [allY[i] for i in order], motions)
+
+        if motions:
+            self.compound(motions)
+
+        # A draft shows the rest of the patch as an outline
+        if self.budget is not None:
+            attribs = {'style':self.outlineStyle(),
+                       'd':rectangle(0, 0, self.options.width, self.options.height, self.encoder)}
+            self.addElement(inkex.addNS('path', 'svg'), attribs)
 
     def __init__(self):
         """
@@ -164,18 +265,122 @@ class LaceGrid(inkex.Effect):
         self.arg_parser.add_argument('--yrand',
                                       type=int,
                                       dest='yrand')
+        self.arg_parser.add_argument('--seed',
+                                      type=int,
+                                      dest='seed',
+                                      default=0,
+                                      help='Seed for the random nudges, 0 for a random seed')
+        # Output description
+        self.arg_parser.add_argument('--outputmode',
+                                     action='store',
+                                     type=str,
+                                     dest='outputmode',
+                                     default='circles',
+                                     help='Output: circles (one per dot) or compound (one combined path)')
+        self.arg_parser.add_argument('--chunk',
+                                     action='store',
+                                     type=int,
+                                     dest='chunk',
+                                     default=0,
+                                     help='Maximum number of dots per combined path, 0 for no limit')
+        self.arg_parser.add_argument('--clip',
+                                     type=inkex.Boolean,
+                                     dest='clip',
+                                     default=True,
+                                     help='Leave out the dots outside the patch')
+        self.arg_parser.add_argument('--order',
+                                     action='store',
+                                     type=str,
+                                     dest='order',
+                                     default='none',
+                                     choices=ORDERS,
+                                     help='Order of the dots: none (row by row), curve (fast), nearest or twoopt (shortest travel)')
+        self.arg_parser.add_argument('--report',
+                                     action='store',
+                                     type=inkex.Boolean,
+                                     dest='report',
+                                     default=False,
+                                     help='Report the travel from dot to dot on stderr')
+        self.arg_parser.add_argument('--overlaps',
+                                     action='store',
+                                     type=str,
+                                     dest='overlaps',
+                                     default='none',
+                                     choices=OVERLAPS,
+                                     help='Dots closer than their diameter: none, report (on stderr) or mark (and draw red marks)')
+        self.arg_parser.add_argument('--export',
+                                     action='store',
+                                     type=str,
+                                     dest='export',
+                                     default='',
+                                     help='Write the dots to this file for other tools instead of drawing them')
+        self.arg_parser.add_argument('--exportformat',
+                                     action='store',
+                                     type=str,
+                                     dest='exportformat',
+                                     default='auto',
+                                     choices=('auto',) + EXPORT_FORMATS,
+                                     help='Format of the export: csv, jsonl, bin or auto (by the extension of the file)')
+        self.arg_parser.add_argument('--stream',
+                                     action='store',
+                                     type=inkex.Boolean,
+                                     dest='stream',
+                                     default=False,
+                                     help='Write the generated elements straight to the output file')
+        self.arg_parser.add_argument('--precision',
+                                     action='store',
+                                     type=int,
+                                     dest='precision',
+                                     default=3,
+                                     help='Decimals of the coordinates of the dots, -1 for all')
+        self.arg_parser.add_argument('--replace',
+                                     action='store',
+                                     type=inkex.Boolean,
+                                     dest='replace',
+                                     default=True,
+                                     help='Replace the grid generated before, the selected one or the last one in the layer')
+        self.arg_parser.add_argument('--preview',
+                                     action='store',
+                                     type=inkex.Boolean,
+                                     dest='preview',
+                                     default=False,
+                                     help='Draw a draft: the first dots and the outline of the patch')
+        self.arg_parser.add_argument('--budget',
+                                     action='store',
+                                     type=int,
+                                     dest='budget',
+                                     default=2000,
+                                     help='Maximum number of dots of a draft')
+        self.arg_parser.add_argument('--profile',
+                                     action='store',
+                                     type=str,
+                                     dest='profile',
+                                     default='',
+                                     help='Write timings and counts as JSON to this file, - for stderr')
+        self.stream = None
+        self.export = None
+        self.budget = None
+        self.profile = lace_profile.NULL
+        self.travel = None
+        self.last = None
+        self.pins = None
 
     def effect(self):
         """
         Effect behaviour.
         Overrides base class' method and draws something.
         """
+        self.budget = draftBudget(self.options)
+        params = parameters(self.options)
+        old = findGenerated(self.svg, 'grid') if self.options.replace else None
+
         # Convert user input to universal units
-        self.options.width = self.unitToUu(str(self.options.width)+self.options.patchunits)
-        self.options.height = self.unitToUu(str(self.options.height)+self.options.patchunits)
-        self.options.spacing = self.unitToUu(str(self.options.spacing)+self.options.pinunits)
-        # Convert from diameter to radius
-        self.options.dotwidth = self.unitToUu(str(self.options.dotwidth)+self.options.dotunits)/2
+        with self.profile.phase('units'):
+            self.options.width = self.unitToUu(str(self.options.width)+self.options.patchunits)
+            self.options.height = self.unitToUu(str(self.options.height)+self.options.patchunits)
+            self.options.spacing = self.unitToUu(str(self.options.spacing)+self.options.pinunits)
+            # Convert from diameter to radius
+            self.options.dotwidth = self.unitToUu(str(self.options.dotwidth)+self.options.dotunits)/2
         # Users expect spacing to be the vertical distance between footside pins 
         # (vertical distance between every other row) but in the script we use it 
         # as as diagonal distance between grid points
@@ -185,8 +390,109 @@ class LaceGrid(inkex.Effect):
         
         # Draw a grid of dots based on user inputs
         self.options.dotcolor = self.options.dotcolor.to_rgb()
-        self.draw()
+
+        if self.options.report or self.profile:
+            self.travel = 0.0
+        if self.options.overlaps != 'none':
+            self.pins = ([], [])
+
+        # Only the positions of the dots, for other tools
+        if self.options.export:
+            self.budget = None
+            self.export = GeometryExport(self.options.export, self.options.exportformat,
+                                         self.unitToUu('1'+self.options.patchunits), self.options.precision)
+            with self.profile.phase('geometry'):
+                self.draw()
+            self.export.close()
+            self.reportTravel()
+            self.checkOverlaps()
+            return
+
+        # A grid with the same dots only needs the new color
+        if old is not None:
+            changed = changedParameters(old, params)
+            if self.options.seed == 0 and (self.options.xrand or self.options.yrand):
+                changed.add('seed')
+            if changed.issubset(self.STYLE):
+                style = self.dotStyle()
+                outline = self.outlineStyle()
+                restyle(old, lambda old: outline if 'fill:none' in old else style, params)
+                return
+        self.layer = outputGroup(self.svg, 'grid', params, old, self.dotStyle())
+        self.encoder = PathEncoder(self.options.precision)
+
+        if self.options.stream:
+            self.stream = SvgStream(self.svg, self.layer, self.options.output)
+        self.profile.instrument(self, 'circle', 'elements')
+        self.profile.instrument(self, 'compound', 'elements')
+        self.profile.instrument(self, 'addElement', 'elements', 'elements')
+        with self.profile.phase('geometry'):
+            self.draw()
+        self.checkOverlaps()
+        if self.stream:
+            self.stream.close()
+        self.reportTravel()
+
+    def checkOverlaps(self):
+        """
+        Report the pairs of dots closer than their diameter,
+        and mark them on top of the grid with --overlaps=mark.
+        """
+        if self.pins is None:
+            return
+        xs, ys = self.pins
+        with self.profile.phase('overlaps'):
+            pairs = closePairs(xs, ys, 2*self.options.dotwidth)
+        self.profile.count('overlaps', len(pairs))
+        if not pairs:
+            if self.options.overlaps == 'report':
+                inkex.errormsg('No dots overlap')
+            return
+        closest = min(hypot(xs[i]-xs[j], ys[i]-ys[j]) for i, j in pairs)
+        inkex.errormsg('%d pairs of dots overlap, the closest are %.3f %s apart' %
+                       (len(pairs), closest / self.unitToUu('1'+self.options.patchunits), self.options.patchunits))
+        if self.options.overlaps == 'mark' and not self.export:
+            overlay = overlapOverlay(self.layer, xs, ys, pairs, self.options.dotwidth, self.encoder)
+            if self.stream:
+                self.stream.write(overlay)
+
+    def reportTravel(self):
+        """
+        Report the travel from dot to dot in the units of the patch.
+        """
+        if self.travel is None:
+            return
+        travel = self.travel / self.unitToUu('1'+self.options.patchunits)
+        self.profile.count('travel', round(travel, 3))
+        if self.options.report:
+            inkex.errormsg('travel from dot to dot: %.1f %s' % (travel, self.options.patchunits))
+
+    def has_changed(self, ret):
+        """
+        A streamed document is written already.
+        """
+        if self.stream:
+            return False
+        return inkex.Effect.has_changed(self, ret)
+
+    def load_raw(self):
+        """
+        Read the document, timed when profiling.
+        """
+        self.profile = lace_profile.create('grid', self.options.profile)
+        with self.profile.phase('load'):
+            inkex.Effect.load_raw(self)
+
+    def save_raw(self, ret):
+        """
+        Write the document and the profile report.
+        """
+        with self.profile.phase('save'):
+            inkex.Effect.save_raw(self, ret)
+        if self.profile:
+            self.profile.count('bytes', self.stream.bytes if self.stream else lace_profile.outputSize(self.options.output))
+            self.profile.write()
 
 # Create effect instance and apply it.
-effect = LaceGrid()
-effect.run()
+if __name__ == '__main__':
+    LaceGrid().run()
@@ -25,11 +25,21 @@
 
 import sys
 import os
-from math import sin,cos,radians, ceil
+from math import sin,cos,radians, ceil, floor, hypot
 from lxml import etree
-from random import random
 
 import inkex
+from lace_template import loadTemplate
+from lace_output import SvgStream, parameters, findGenerated, changedParameters, outputGroup, restyle
+from lace_output import draftBudget, rectangle, PathEncoder, GeometryExport, EXPORT_FORMATS
+from lace_output import OVERLAPS, overlapOverlay
+from lace_geometry import Jitter, EdgeSet, Rectangle, chain, closePairs
+import lace_profile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 __author__ = 'Veronika Irvine'
 __credits__ = ['Ben Connors', 'Veronika Irvine', 'Mark Shafer']
@@ -42,6 +52,9 @@ class LaceGround(inkex.Effect):
     using specified angle and spacing
     """
 
+    # options that only change the style of the lines
+    STYLE = ('linewidth', 'lineunits', 'linecolor')
+
     def unitToUu(self,param):
         """ Convert units.
         Converts a number in some units into the units used internally by 
@@ -75,42 +88,13 @@ class LaceGround(inkex.Effect):
         if extension != '.txt':
             inkex.errormsg('The file name must end with .txt.\n\nYour entry: '+self.options.file)
             exit()
-            
-        data = []
-        rowCount = 0
-        colCount = 0
-        with open(self.options.file,'r') as f:
-            first = True
-            for line in f:
-                if first:
-                    # first line of file gives row count and column count
-                    first = False
-                    line = line.strip()
-                    temp = line.split('\t')
-                    type = temp[0]
-                    rowCount = int(temp[1])
-                    colCount = int(temp[-1])
-                    
-                else:
-                    line = line.strip()
-                    line = line.lstrip('[')
-                    line = line.rstrip(']')
-                    rowData = line.split(']\t[')
-                    data.append([])
-                    for cell in rowData:
-                        cell = cell.strip()
-                        data[-1].append([float(num) for num in cell.split(',')])
-                        
-        return {'type':type, 'rowCount':rowCount, 'colCount':colCount, 'data':data}
-
-    def line(self, x1, y1, x2, y2):
-        """
-        Draw a line from point at (x1, y1) to point at (x2, y2).
-        Style of line is hard coded and specified by 's'.
-        """
-        # define the motions
-        path = 'M %s,%s L %s,%s' %(x1,y1,x2,y2)
-        
+
+        return loadTemplate(self.options.file)
+
+    def lineStyle(self):
+        """
+        Style of the lines.
+        """
         # define the stroke style
         s = {'stroke-linejoin': 'miter', 
             'stroke-width': self.options.linewidth,
@@ -121,46 +105,129 @@ class LaceGround(inkex.Effect):
             'stroke-linejoin': 'miter',
             'fill': 'none'
         }
-        
-        # create attributes from style and path
-        attribs = {'style':str(inkex.Style(s)), 'd':path}
-        
-        # insert path object into current layer
-        etree.SubElement(self.svg.get_current_layer(), inkex.addNS('path', 'svg'), attribs)
-
-    def jitter(self, nodeJitter, x, y):
-        if self.options.xrand == 0 and self.options.yrand == 0:
-            return [x,y]
-        id = "%.3f" % x +",%.3f" % y
-        value = nodeJitter.get(id)
-        if not value:
-            jitx = x + self.options.xrand*(2.0*random()-1.0)*self.options.spacing/100
-            jity = y + self.options.yrand*(2.0*random()-1.0)*self.options.spacing/100
-            value = [jitx,jity]
-            nodeJitter[id] = value
-        return value
+        return str(inkex.Style(s))
 
-    def draw(self, data, rowCount, colCount):
-        a = self.options.spacing
-        theta = self.options.angle
-        deltaX = a*sin(theta) 
-        deltaY = a*cos(theta)
-        maxRows = ceil(self.options.height / deltaY)
-        maxCols = ceil(self.options.width  / deltaX)
+    def path(self, path):
+        """
+        Insert a path with motions 'path' into the generated group.
+        """
+        # create attributes from path, the style is that of the group
+        attribs = {'d':path}
         
-        x = 0.0
-        y = 0.0
-        repeatY = 0
-        repeatX = 0
+        # insert path object into the generated group
+        self.addElement(inkex.addNS('path', 'svg'), attribs)
+
+    def addElement(self, tag, attribs):
+        """
+        Insert a new element into the generated group,
+        or write it straight to the output when streaming.
+        """
+        if self.stream:
+            self.stream.add(tag, attribs)
+        else:
+            etree.SubElement(self.layer, tag, attribs)
+
+    def stroke(self, points, motions):
+        """
+        Draw a line through the points: a path of its own,
+        or a subpath collected in motions for a compound path.
+        When exporting, write its nodes and edges instead.
+        """
+        if self.export:
+            self.export.polyline(points)
+        elif self.options.outputmode == 'compound':
+            motions.append(self.encoder.polyline(points))
+            if len(motions) == self.options.chunk:
+                self.compound(motions)
+                del motions[:]
+                self.encoder.reset()
+        else:
+            self.path(self.encoder.path(points))
+
+    def compound(self, motions):
+        """
+        Draw a list of subpath motions as one compound path,
+        or as chunks of at most --chunk subpaths.
+        """
+        size = self.options.chunk or len(motions) or 1
+        for i in range(0, len(motions), size):
+            self.path(''.join(motions[i:i+size]))
+
+    def nodes(self, segments, patch):
+        """
+        Collect the end points of the segments not seen before in self.pins,
+        with --clip only those inside the patch: the ends cut at the border are no pins.
+        """
+        xs = []
+        ys = []
+        for x1,y1,x2,y2 in segments:
+            for x, y in ((x1,y1), (x2,y2)):
+                key = (round(x, 6), round(y, 6))
+                if key not in self.seen:
+                    self.seen.add(key)
+                    xs.append(x)
+                    ys.append(y)
+        if self.options.clip:
+            xs, ys = patch.points(xs, ys)
+        self.pins[0].extend(xs)
+        self.pins[1].extend(ys)
+
+    def checkOverlaps(self):
+        """
+        Report the pairs of pins closer than the width of the lines,
+        and mark them on top of the ground with --overlaps=mark.
+        """
+        if self.pins is None:
+            return
+        xs, ys = self.pins
+        with self.profile.phase('overlaps'):
+            pairs = closePairs(xs, ys, self.options.linewidth)
+        self.profile.count('overlaps', len(pairs))
+        if not pairs:
+            if self.options.overlaps == 'report':
+                inkex.errormsg('No pins overlap')
+            return
+        closest = min(hypot(xs[i]-xs[j], ys[i]-ys[j]) for i, j in pairs)
+        inkex.errormsg('%d pairs of pins overlap, the closest are %.3f %s apart' %
+                       (len(pairs), closest / self.unitToUu('1'+self.options.patchunits), self.options.patchunits))
+        if self.options.overlaps == 'mark' and not self.export:
+            overlay = overlapOverlay(self.layer, xs, ys, pairs, self.options.linewidth, self.encoder)
+            if self.stream:
+                self.stream.write(overlay)
+
+    def repeatOffsets(self, maxCount, count, delta):
+        """
+        Offsets of the template repeats along one axis.
+        Accumulated step by step, like the reference loop does.
+        """
+        offsets = []
+        offset = 0.0
+        repeat = 0
+        while repeat * count < maxCount:
+            offsets.append(offset)
+            repeat += 1
+            offset += delta * count
+        return offsets
 
-        # Random jitter of nodes
-        nodeJitter = {}
+    def repeatsInside(self, data, deltaX, deltaY, offsetsX, offsetsY, patch):
+        """
+        Offsets of the repeats that touch the patch.
+        """
+        xs = [coords[i] for row in data for coords in row for i in (0, 2, 4)] or [0]
+        ys = [coords[i] for row in data for coords in row for i in (1, 3, 5)] or [0]
+        insideX = [x for x in offsetsX if patch.overlaps(x + min(xs)*deltaX, 0, x + max(xs)*deltaX, 0)]
+        insideY = [y for y in offsetsY if patch.overlaps(0, y + min(ys)*deltaY, 0, y + max(ys)*deltaY)]
+        return insideX, insideY
 
-        while repeatY * rowCount < maxRows:
-            x = 0.0
-            repeatX = 0
+    def segmentsLoop(self, data, deltaX, deltaY, offsetsX, offsetsY):
+        """
+        Reference engine: walk over every cell of every repeat of the template.
+        Generates for each row of repeats a list of segments (x1, y1, x2, y2).
+        """
+        for y in offsetsY:
+            segments = []
             
-            while repeatX * colCount < maxCols:
+            for x in offsetsX:
                 
                 for row in data:
                     for coords in row:
@@ -170,19 +237,166 @@ class LaceGround(inkex.Effect):
                         y2 = y + coords[3]*deltaY
                         x3 = x + coords[4]*deltaX
                         y3 = y + coords[5]*deltaY
-                        x1,y1 = self.jitter(nodeJitter,x1,y1)
-                        x2,y2 = self.jitter(nodeJitter,x2,y2)
-                        x3,y3 = self.jitter(nodeJitter,x3,y3)
-
-                        self.line(x1,y1,x2,y2)
-                        self.line(x1,y1,x3,y3)
-                    
-                repeatX += 1
-                x += deltaX * colCount
-
-            repeatY += 1
-            y += deltaY * rowCount
+
+                        segments.append((x1,y1,x2,y2))
+                        segments.append((x1,y1,x3,y3))
+
+            yield segments
+
+    def segmentsBatch(self, data, deltaX, deltaY, offsetsX, offsetsY):
+        """
+        Batched engine: scale the template once into a coordinate array
+        and expand the repeats by adding the repeat offsets,
+        one row of repeats at a time to keep memory use flat.
+        Generates the same lists of segments as segmentsLoop.
+        """
+        cells = numpy.array([coords for row in data for coords in row], dtype=float).reshape(-1, 6)
+        xs = cells[:, 0::2] * deltaX
+        ys = cells[:, 1::2] * deltaY
+        offsetsX = numpy.array(offsetsX)
+
+        # axes: repeatX, cell, point within cell
+        px = offsetsX[:, None, None] + xs[None, :, :]
+        # axes: repeatX, cell, segment within cell, x1 y1 x2 y2
+        segments = numpy.empty(px.shape[:2] + (2, 4))
+        segments[..., :, 0] = px[..., 0:1]
+        segments[..., :, 2] = px[..., 1:]
+
+        for offsetY in offsetsY:
+            py = offsetY + ys
+            segments[..., :, 1] = py[None, :, 0:1]
+            segments[..., :, 3] = py[None, :, 1:]
+            yield segments.reshape(-1, 4).tolist()
+
+    def draw(self, data, rowCount, colCount):
+        a = self.options.spacing
+        theta = self.options.angle
+        deltaX = a*sin(theta) 
+        deltaY = a*cos(theta)
+        maxRows = ceil(self.options.height / deltaY)
+        maxCols = ceil(self.options.width  / deltaX)
+
+        offsetsX = self.repeatOffsets(maxCols, colCount, deltaX)
+        offsetsY = self.repeatOffsets(maxRows, rowCount, deltaY)
+
+        # Skip repeats that lie outside the patch, nudges may bring nodes back in
+        patch = Rectangle(self.options.width, self.options.height,
+                          max(self.options.xrand, self.options.yrand)*a/100)
+        if self.options.clip:
+            offsetsX, offsetsY = self.repeatsInside(data, deltaX, deltaY, offsetsX, offsetsY, patch)
+
+        if self.options.engine == 'reference' or numpy is None:
+            bands = self.segmentsLoop(data, deltaX, deltaY, offsetsX, offsetsY)
+        else:
+            bands = self.segmentsBatch(data, deltaX, deltaY, offsetsX, offsetsY)
+
+        # Segments along the seams of the repeats come from both sides,
+        # a band of repeats can repeat segments of the bands that are this close
+        ys = [coords[i] for row in data for coords in row for i in (1, 3, 5)]
+        window = int(floor((max(ys) - min(ys)) / rowCount)) if ys else 0
+        edges = EdgeSet(deltaX, deltaY, window)
+        if self.export:
+            # a band shares its nodes with the bands that can repeat its segments and the one after them
+            self.export.remember(window + 2)
+
+        # Random jitter of nodes, keyed on their position in the template grid
+        jitter = Jitter(self.options.xrand*a/100, self.options.yrand*a/100, deltaX, deltaY, self.options.seed)
+
+        motions = []
+        chained = []
+        for segments in bands:
+            if self.export:
+                self.export.band()
+            if self.options.dedup:
+                segments = edges.unique(segments)
+            if jitter:
+                segments = jitter.segments(segments)
+            if self.pins is not None:
+                self.nodes(segments, patch)
+            if self.options.clip:
+                segments = patch.segments(segments)
+            if self.budget is not None:
+                segments = segments[:self.budget.take(len(segments))]
+            if self.profile:
+                self.profile.count('segments', len(segments))
+            if self.options.chain:
+                chained.extend(segments)
+            else:
+                for x1,y1,x2,y2 in segments:
+                    self.stroke(((x1,y1),(x2,y2)), motions)
+            if self.budget is not None and not self.budget:
+                break
+
+        # Lines that meet are drawn as one, for plotters and cutters
+        if self.options.chain:
+            strokes = chain(chained)
+            if self.profile:
+                self.profile.count('strokes', len(strokes))
+            if self.options.report:
+                inkex.errormsg('%d lines chained into %d strokes' % (len(chained), len(strokes)))
+            for points in strokes:
+                self.stroke(points, motions)
+        self.compound(motions)
+
+        # A draft shows the rest of the patch as an outline
+        if self.budget is not None:
+            self.path(rectangle(0, 0, self.options.width, self.options.height, self.encoder))
+
+        if self.options.report and self.options.dedup:
+            inkex.errormsg('%d duplicate lines removed' % edges.removed)
         
+    def drawPattern(self, data, rowCount, colCount):
+        """
+        Draw one repeat of the template into a pattern tile
+        and fill the patch with that pattern.
+        Only for grounds without nudges, where all repeats are the same.
+        """
+        a = self.options.spacing
+        theta = self.options.angle
+        deltaX = a*sin(theta)
+        deltaY = a*cos(theta)
+        tileWidth = deltaX*colCount
+        tileHeight = deltaY*rowCount
+
+        # The pattern cuts everything at the border of the tile, so the tile
+        # takes the lines of all repeats that reach into it, widened by the lines
+        xs = [abs(coords[i]) for row in data for coords in row for i in (0, 2, 4)] or [0]
+        ys = [abs(coords[i]) for row in data for coords in row for i in (1, 3, 5)] or [0]
+        reachX = int(ceil(max(xs) / colCount))
+        reachY = int(ceil(max(ys) / rowCount))
+        offsetsX = [i*tileWidth for i in range(-reachX, reachX+1)]
+        offsetsY = [i*tileHeight for i in range(-reachY, reachY+1)]
+        tile = Rectangle(tileWidth, tileHeight, self.options.linewidth)
+        offsetsX, offsetsY = self.repeatsInside(data, deltaX, deltaY, offsetsX, offsetsY, tile)
+        segments = [(x1, y1, x2, y2) for band in self.segmentsLoop(data, deltaX, deltaY, offsetsX, offsetsY)
+                    for x1, y1, x2, y2 in band
+                    if tile.overlaps(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))]
+        if self.options.dedup:
+            segments = EdgeSet(deltaX, deltaY).unique(segments)
+        if self.profile:
+            self.profile.count('segments', len(segments))
+
+        # The size of the tile in full precision, rounding would add up over the tiles
+        defs = etree.SubElement(self.layer, inkex.addNS('defs', 'svg'))
+        attribs = {'id':self.svg.get_unique_id('laceground'),
+                   'patternUnits':'userSpaceOnUse',
+                   'width':str(tileWidth),
+                   'height':str(tileHeight)}
+        pattern = etree.SubElement(defs, inkex.addNS('pattern', 'svg'), attribs)
+        motions = ''.join(self.encoder.polyline(((x1,y1),(x2,y2))) for x1,y1,x2,y2 in segments)
+        etree.SubElement(pattern, inkex.addNS('path', 'svg'), {'style':self.style, 'd':motions})
+
+        # Without clipping the patch ends with whole repeats, like the lines would
+        width = self.options.width
+        height = self.options.height
+        if not self.options.clip:
+            width = ceil(ceil(width / deltaX) / colCount) * tileWidth
+            height = ceil(ceil(height / deltaY) / rowCount) * tileHeight
+        number = self.encoder.number
+        attribs = {'style':'fill:url(#%s);stroke:none' % attribs['id'],
+                   'x':'0', 'y':'0', 'width':number(width), 'height':number(height)}
+        self.addElement(inkex.addNS('rect', 'svg'), attribs)
+
     def __init__(self):
         """
         Constructor.
@@ -230,19 +444,117 @@ class LaceGround(inkex.Effect):
         self.arg_parser.add_argument('--yrand',
                                       type=int,
                                       dest='yrand')
+        self.arg_parser.add_argument('--seed',
+                                      type=int,
+                                      dest='seed',
+                                      default=0,
+                                      help='Seed for the random nudges, 0 for a random seed')
+        self.arg_parser.add_argument('--engine',
+                                     type=str,
+                                     dest='engine',
+                                     default='batch',
+                                     help='Geometry engine: batch or reference')
+        self.arg_parser.add_argument('--outputmode',
+                                     type=str,
+                                     dest='outputmode',
+                                     default='paths',
+                                     help='Output: paths (one per segment), compound (one combined path) or pattern (one repeat as a pattern)')
+        self.arg_parser.add_argument('--chunk',
+                                     type=int,
+                                     dest='chunk',
+                                     default=0,
+                                     help='Maximum number of segments per combined path, 0 for no limit')
+        self.arg_parser.add_argument('--clip',
+                                     type=inkex.Boolean,
+                                     dest='clip',
+                                     default=True,
+                                     help='Cut the lines at the border of the patch')
+        self.arg_parser.add_argument('--dedup',
+                                     type=inkex.Boolean,
+                                     dest='dedup',
+                                     default=True,
+                                     help='Draw lines shared by neighbouring repeats only once')
+        self.arg_parser.add_argument('--chain',
+                                     type=inkex.Boolean,
+                                     dest='chain',
+                                     default=False,
+                                     help='Join lines that meet into as few strokes as possible')
+        self.arg_parser.add_argument('--report',
+                                     type=inkex.Boolean,
+                                     dest='report',
+                                     default=False,
+                                     help='Report statistics of the drawing on stderr')
+        self.arg_parser.add_argument('--overlaps',
+                                     type=str,
+                                     dest='overlaps',
+                                     default='none',
+                                     choices=OVERLAPS,
+                                     help='Pins closer than the line width: none, report (on stderr) or mark (and draw red marks)')
+        self.arg_parser.add_argument('--export',
+                                     type=str,
+                                     dest='export',
+                                     default='',
+                                     help='Write the nodes and lines to files for other tools instead of drawing them')
+        self.arg_parser.add_argument('--exportformat',
+                                     type=str,
+                                     dest='exportformat',
+                                     default='auto',
+                                     choices=('auto',) + EXPORT_FORMATS,
+                                     help='Format of the export: csv, jsonl, bin or auto (by the extension of the file)')
+        self.arg_parser.add_argument('--stream',
+                                     type=inkex.Boolean,
+                                     dest='stream',
+                                     default=False,
+                                     help='Write the generated elements straight to the output file')
+        self.arg_parser.add_argument('--precision',
+                                     type=int,
+                                     dest='precision',
+                                     default=3,
+                                     help='Decimals of the coordinates in the path data, -1 for all')
+        self.arg_parser.add_argument('--replace',
+                                     type=inkex.Boolean,
+                                     dest='replace',
+                                     default=True,
+                                     help='Replace the ground generated before, the selected one or the last one in the layer')
+        self.arg_parser.add_argument('--preview',
+                                     type=inkex.Boolean,
+                                     dest='preview',
+                                     default=False,
+                                     help='Draw a draft: the first lines and the outline of the patch')
+        self.arg_parser.add_argument('--budget',
+                                     type=int,
+                                     dest='budget',
+                                     default=2000,
+                                     help='Maximum number of lines of a draft')
+        self.arg_parser.add_argument('--profile',
+                                     type=str,
+                                     dest='profile',
+                                     default='',
+                                     help='Write timings and counts as JSON to this file, - for stderr')
+        self.stream = None
+        self.export = None
+        self.budget = None
+        self.profile = lace_profile.NULL
+        self.pins = None
+        self.seen = None
 
     def effect(self):
         """
         Effect behaviour.
         Overrides base class' method and draws something.
         """
-        result = self.loadFile()
+        with self.profile.phase('template'):
+            result = self.loadFile()
+        self.budget = draftBudget(self.options)
+        params = parameters(self.options)
+        old = findGenerated(self.svg, 'ground') if self.options.replace else None
         
         # Convert input to universal units
-        self.options.width = self.unitToUu(str(self.options.width)+self.options.patchunits)
-        self.options.height = self.unitToUu(str(self.options.height)+self.options.patchunits)
-        self.options.linewidth = self.unitToUu(str(self.options.linewidth)+self.options.lineunits)
-        self.options.spacing = self.unitToUu(str(self.options.spacing)+self.options.pinunits)
+        with self.profile.phase('units'):
+            self.options.width = self.unitToUu(str(self.options.width)+self.options.patchunits)
+            self.options.height = self.unitToUu(str(self.options.height)+self.options.patchunits)
+            self.options.linewidth = self.unitToUu(str(self.options.linewidth)+self.options.lineunits)
+            self.options.spacing = self.unitToUu(str(self.options.spacing)+self.options.pinunits)
         
         # Users expect spacing to be the vertical distance between footside pins 
         # (vertical distance between every other row) but in the script we use it 
@@ -253,9 +565,86 @@ class LaceGround(inkex.Effect):
         
         # Draw a ground based on file description and user inputs
         self.options.linecolor = self.options.linecolor.to_rgb()
+        self.style = self.lineStyle()
+
+        if self.options.overlaps != 'none':
+            self.pins = ([], [])
+            self.seen = set()
+
+        # Only the nodes and lines, for other tools
+        if self.options.export:
+            self.budget = None
+            # chained strokes would come out of band order and outlive the node memory
+            self.options.chain = False
+            self.export = GeometryExport(self.options.export, self.options.exportformat,
+                                         self.unitToUu('1'+self.options.patchunits), self.options.precision)
+            with self.profile.phase('geometry'):
+                self.draw(result['data'],result['rowCount'],result['colCount'])
+            self.export.close()
+            self.profile.count('nodes', self.export.points)
+            self.profile.count('edges', self.export.edges)
+            self.checkOverlaps()
+            return
+
+        # A ground with the same geometry only needs the new style
+        if old is not None:
+            changed = changedParameters(old, params)
+            if self.options.seed == 0 and (self.options.xrand or self.options.yrand):
+                changed.add('seed')
+            if changed.issubset(self.STYLE):
+                restyle(old, lambda style: style if 'url(' in style else self.style, params)
+                return
+        self.layer = outputGroup(self.svg, 'ground', params, old, self.style)
+        self.encoder = PathEncoder(self.options.precision)
+
+        # Nudges make every repeat different
+        if self.options.outputmode == 'pattern' and (self.options.xrand or self.options.yrand):
+            inkex.errormsg('A ground with random nudges is drawn with paths, not with a pattern.')
+            self.options.outputmode = 'paths'
+
         # For now, assume style is Checker but could change in future
-        self.draw(result['data'],result['rowCount'],result['colCount'])
+        if self.options.outputmode == 'pattern':
+            # one tile and one rectangle: all of it fits in memory
+            self.profile.instrument(self, 'addElement', 'elements', 'elements')
+            with self.profile.phase('geometry'):
+                self.drawPattern(result['data'],result['rowCount'],result['colCount'])
+            return
+        if self.options.stream:
+            self.stream = SvgStream(self.svg, self.layer, self.options.output)
+        self.profile.instrument(self, 'path', 'elements')
+        self.profile.instrument(self, 'addElement', 'elements', 'elements')
+        with self.profile.phase('geometry'):
+            self.draw(result['data'],result['rowCount'],result['colCount'])
+        self.checkOverlaps()
+        if self.stream:
+            self.stream.close()
+
+    def has_changed(self, ret):
+        """
+        A streamed document is written already.
+        """
+        if self.stream:
+            return False
+        return inkex.Effect.has_changed(self, ret)
+
+    def load_raw(self):
+        """
+        Read the document, timed when profiling.
+        """
+        self.profile = lace_profile.create('ground', self.options.profile)
+        with self.profile.phase('load'):
+            inkex.Effect.load_raw(self)
+
+    def save_raw(self, ret):
+        """
+        Write the document and the profile report.
+        """
+        with self.profile.phase('save'):
+            inkex.Effect.save_raw(self, ret)
+        if self.profile:
+            self.profile.count('bytes', self.stream.bytes if self.stream else lace_profile.outputSize(self.options.output))
+            self.profile.write()
 
 # Create effect instance and apply it.
-effect = LaceGround()
-effect.run()
+if __name__ == '__main__':
+    LaceGround().run()
@@ -0,0 +1,546 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2026, the inkscape-bobbinlace contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Output helpers shared by the grid and ground extensions.
+"""
+
+import os
+import sys
+import json
+import uuid
+from array import array
+from collections import deque
+
+from lxml import etree
+
+__license__ = 'Simplified BSD'
+__version__ = '__VERSION__'
+
+SVG = 'http://www.w3.org/2000/svg'
+INKSCAPE = 'http://www.inkscape.org/namespaces/inkscape'
+# attributes of the groups with generated elements
+NS = 'http://d-bl.github.io/inkscape-bobbinlace'
+EFFECT = '{%s}effect' % NS
+PARAMS = '{%s}params' % NS
+# marks a group that shows problems rather than generated elements
+OVERLAY = '{%s}overlay' % NS
+
+# environment variable that asks for drafts
+PREVIEW = 'LACE_PREVIEW'
+
+# options that don't change the generated elements
+IGNORED = ('input_file', 'output', 'ids', 'selected_nodes', 'tab', 'profile', 'stream', 'replace')
+
+# formats of GeometryExport and the file extensions that select them
+EXPORT_FORMATS = ('csv', 'jsonl', 'bin')
+EXPORT_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# what to do with pins that overlap
+OVERLAPS = ('none', 'report', 'mark')
+
+
+class PathEncoder(object):
+    """
+    Short path data.
+
+    Coordinates are rounded to a number of decimals and each motion is
+    written absolute or relative to the current point, whichever is shorter.
+    Lines along an axis become H or V motions. Numbers drop trailing zeros
+    and leading zeros before the decimal point, separators are left out
+    where a minus sign separates the numbers already.
+    """
+
+    def __init__(self, precision=-1):
+        """
+        precision is the number of decimals, a negative number keeps all.
+        """
+        self.precision = precision
+        self.format = '%%.%df' % precision if precision >= 0 else None
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new path: the next motion is absolute.
+        """
+        self.current = None
+        self.start = None
+
+    def round(self, value):
+        if self.format is None:
+            return float(value)
+        return round(value, self.precision) + 0.0
+
+    def number(self, value):
+        """
+        The shortest text for a number rounded to the precision.
+        """
+        if self.format is None:
+            text = repr(float(value))
+            if text.endswith('.0'):
+                text = text[:-2]
+        else:
+            text = self.format % value
+            if self.precision:
+                text = text.rstrip('0').rstrip('.')
+        # no zero before the decimal point, no sign for zero
+        if text[0] == '-':
+            if text[1] == '0':
+                text = '-' + text[2:] if len(text) > 2 else '0'
+        elif text[0] == '0' and len(text) > 1:
+            text = text[1:]
+        return text
+
+    def pair(self, x, y):
+        """
+        Two numbers, separated by a comma unless the sign separates them.
+        """
+        y = self.number(y)
+        return self.number(x) + (y if y[0] == '-' else ',' + y)
+
+    def moveTo(self, x, y):
+        x, y = self.round(x), self.round(y)
+        motion = 'M' + self.pair(x, y)
+        if self.current is not None:
+            relative = 'm' + self.pair(x - self.current[0], y - self.current[1])
+            if len(relative) < len(motion):
+                motion = relative
+        self.current = self.start = (x, y)
+        return motion
+
+    def lineTo(self, x, y):
+        x, y = self.round(x), self.round(y)
+        cx, cy = self.current
+        if y == cy:
+            motion, relative = 'H' + self.number(x), 'h' + self.number(x - cx)
+        elif x == cx:
+            motion, relative = 'V' + self.number(y), 'v' + self.number(y - cy)
+        else:
+            motion, relative = 'L' + self.pair(x, y), 'l' + self.pair(x - cx, y - cy)
+        self.current = (x, y)
+        return relative if len(relative) < len(motion) else motion
+
+    def arcTo(self, r, large, sweep, x, y):
+        x, y = self.round(x), self.round(y)
+        cx, cy = self.current
+        flags = self.number(r) + ',' + self.number(r) + ' 0 %d %d ' % (large, sweep)
+        motion, relative = 'A' + flags + self.pair(x, y), 'a' + flags + self.pair(x - cx, y - cy)
+        self.current = (x, y)
+        return relative if len(relative) < len(motion) else motion
+
+    def close(self):
+        self.current = self.start
+        return 'z'
+
+    def polyline(self, points):
+        """
+        Motions for a line through the points, continuing the current path.
+        """
+        motions = self.moveTo(*points[0])
+        for x, y in points[1:]:
+            motions += self.lineTo(x, y)
+        return motions
+
+    def path(self, points):
+        """
+        Motions for a path of its own with a line through the points.
+        """
+        self.reset()
+        return self.polyline(points)
+
+
+class Budget(object):
+    """
+    Number of elements a draft may still generate.
+    A budget that is used up is false.
+    """
+
+    def __init__(self, limit):
+        self.left = max(0, limit)
+
+    def __bool__(self):
+        return self.left > 0
+
+    def take(self, count):
+        """
+        How many of count elements fit in the budget, taken from it.
+        """
+        count = min(count, self.left)
+        self.left -= count
+        return count
+
+
+def draftBudget(options):
+    """
+    The budget of a draft run, None for a run with full detail.
+    --preview or the environment variable LACE_PREVIEW asks for a draft,
+    the options then tell it is a preview so that its parameters differ
+    from those of the run with full detail.
+    """
+    if not (options.preview or os.environ.get(PREVIEW)):
+        return None
+    options.preview = True
+    return Budget(options.budget)
+
+
+def rectangle(left, top, right, bottom, encoder=None):
+    """
+    Path motions for the outline of a rectangle, a path of its own.
+    """
+    encoder = encoder or PathEncoder()
+    return encoder.path(((left, top), (right, top), (right, bottom), (left, bottom))) + encoder.close()
+
+
+def parameters(options):
+    """
+    The options that determine the generated elements,
+    as a dictionary of values that JSON can represent.
+    Call this before the effect converts the options.
+    """
+    params = {}
+    for key, value in vars(options).items():
+        if key in IGNORED:
+            continue
+        if not isinstance(value, (int, float, bool, type(None))):
+            value = str(value)
+        params[key] = value
+    return params
+
+
+def generatedGroup(element, effect):
+    """
+    The group generated by the effect that contains the element, None if there is none.
+    """
+    while element is not None:
+        if element.get(EFFECT) == effect:
+            return element
+        element = element.getparent()
+    return None
+
+
+def findGenerated(svg, effect):
+    """
+    The group generated earlier by the effect:
+    the one that holds the first selected element, or without a selection
+    the last one in the current layer. None when there is none.
+    """
+    for element in svg.selection.values():
+        group = generatedGroup(element, effect)
+        if group is not None:
+            return group
+    if len(svg.selection):
+        return None
+    groups = [child for child in svg.get_current_layer() if child.get(EFFECT) == effect]
+    return groups[-1] if groups else None
+
+
+def changedParameters(group, params):
+    """
+    Names of the parameters that differ from those the group was generated with.
+    """
+    try:
+        previous = json.loads(group.get(PARAMS) or '{}')
+    except ValueError:
+        previous = {}
+    return set(key for key in set(params) | set(previous) if params.get(key) != previous.get(key))
+
+
+def outputGroup(svg, effect, params, old=None, style=None):
+    """
+    The group to receive the generated elements, labelled with the effect
+    and the parameters. An old group is emptied and reused, so it keeps its
+    place, id and transform; otherwise a new group is added to the current layer.
+    The style, if any, is shared by the generated elements.
+    """
+    if old is None:
+        old = etree.SubElement(svg.get_current_layer(), '{%s}g' % SVG, nsmap={'lace': NS})
+        old.set('{%s}label' % INKSCAPE, effect)
+    else:
+        del old[:]
+    old.set(EFFECT, effect)
+    old.set(PARAMS, json.dumps(params, sort_keys=True))
+    if style is not None:
+        etree.ElementBase.set(old, 'style', style)
+    elif old.get('style') is not None:
+        del old.attrib['style']
+    return old
+
+
+def restyle(group, style, params):
+    """
+    Give the generated elements in the group a new style without generating
+    them again. style(old) returns the new style for an old style attribute.
+    """
+    styles = {}
+    for element in group.iter():
+        # the plain lxml methods, InkScape elements would parse each style
+        old = etree.ElementBase.get(element, 'style')
+        if old is None or element.get(OVERLAY) is not None:
+            continue
+        if old not in styles:
+            styles[old] = style(old)
+        etree.ElementBase.set(element, 'style', styles[old])
+    group.set(PARAMS, json.dumps(params, sort_keys=True))
+
+
+def overlapOverlay(parent, xs, ys, pairs, width, encoder):
+    """
+    Add a group that marks pairs of points (i, j) with a red line between
+    them, width wide and with round caps, so points on top of each other
+    get a red dot. Restyling the generated elements leaves it alone.
+    Returns the group.
+    """
+    style = 'fill:none;stroke:#ff0000;stroke-opacity:0.6;stroke-linecap:round;stroke-width:%s' % encoder.number(width)
+    attribs = {'{%s}label' % INKSCAPE: 'overlapping pins', OVERLAY: str(len(pairs))}
+    group = etree.SubElement(parent, '{%s}g' % SVG, attribs)
+    etree.ElementBase.set(group, 'style', style)
+    encoder.reset()
+    motions = [encoder.moveTo(xs[i], ys[i]) + encoder.lineTo(xs[j], ys[j]) for i, j in pairs]
+    etree.SubElement(group, '{%s}path' % SVG, {'d': ''.join(motions)})
+    return group
+
+
+class SvgStream(object):
+    """
+    Write a document while new elements are added to one of its groups.
+
+    Every element is serialized and dropped as soon as it is added,
+    so memory does not grow with the number of generated elements.
+    The bytes written are the same as when the elements would have been
+    appended to the group and the whole document saved afterwards.
+    """
+
+    def __init__(self, document, parent, output):
+        """
+        document is the root of the svg document, parent the group that
+        receives the new elements and output a file name or a binary stream.
+        """
+        self.parent = parent
+        if isinstance(output, str):
+            self.output = open(output, 'wb')
+            self.owned = True
+        else:
+            self.output = output
+            self.owned = False
+
+        # serialize the document with a marker where the new elements go
+        marker = etree.Comment(uuid.uuid4().hex)
+        parent.append(marker)
+        try:
+            text = document.tostring()
+        finally:
+            parent.remove(marker)
+        prefix, self.suffix = text.split(etree.tostring(marker), 1)
+        self.output.write(prefix)
+
+        # a detached fragment repeats the namespace declarations in scope
+        self.declarations = []
+        for name, uri in parent.nsmap.items():
+            if name is None:
+                self.declarations.append(b' xmlns="%s"' % uri.encode())
+            else:
+                self.declarations.append(b' xmlns:%s="%s"' % (name.encode(), uri.encode()))
+        self.count = 0
+        self.bytes = len(prefix)
+
+    def add(self, tag, attribs):
+        """
+        Write a new element without children.
+        """
+        self.write(etree.SubElement(self.parent, tag, attribs))
+
+    def write(self, element):
+        """
+        Write a complete element that was added to the parent and drop it.
+        """
+        text = etree.tostring(element)
+        head, separator, tail = text.partition(b'>')
+        for declaration in self.declarations:
+            head = head.replace(declaration, b'', 1)
+        text = head + separator + tail
+        self.output.write(text)
+        self.parent.remove(element)
+        self.count += 1
+        self.bytes += len(text)
+
+    def close(self):
+        """
+        Write the rest of the document.
+        """
+        self.output.write(self.suffix)
+        self.bytes += len(self.suffix)
+        if self.owned:
+            self.output.close()
+        else:
+            self.output.flush()
+
+
+class GeometryExport(object):
+    """
+    Write the generated geometry for other tools instead of svg elements.
+
+    The grids write their pins, one x, y pair per pin. The grounds write
+    numbered nodes the same way and their lines as edges between node
+    numbers to a second file, name-edges.ext next to the first. The node
+    number is the position in the file, counting from 0.
+
+    csv: a header line and then x,y or a,b per line
+    jsonl: [x, y] or [a, b] per line, JSON Lines rather than one JSON document
+    bin: little endian float64 x, y pairs and uint32 a, b pairs, for example
+         numpy.fromfile(name, '<f8').reshape(-1, 2)
+
+    Every call writes its rows at once. The lines arrive in bands, one row
+    of repeats or one wedge at a time, and share nodes only with the bands
+    close to them, so only the numbers of the nodes of the last bands are
+    remembered, see remember, plus those of a band kept with band(keep=True).
+    Coordinates are divided by scale to get them in the units of the
+    dialog and rounded to precision decimals, a negative number keeps all.
+    """
+
+    def __init__(self, path, format='auto', scale=1.0, precision=-1):
+        if format == 'auto':
+            format = EXPORT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'bin')
+        if format not in EXPORT_FORMATS:
+            raise ValueError('Unknown export format: %s' % format)
+        self.path = path
+        self.format = format
+        self.scale = scale
+        self.precision = precision
+        self.pointFile = self.open(path, 'x,y')
+        self.edgeFile = None
+        self.bands = deque([{}])
+        self.kept = {}
+        self.points = 0
+        self.edges = 0
+
+    def edgePath(self):
+        """
+        Name of the file with the edges.
+        """
+        stem, extension = os.path.splitext(self.path)
+        return stem + '-edges' + extension
+
+    def open(self, path, header):
+        if self.format == 'bin':
+            return open(path, 'wb')
+        f = open(path, 'w', newline='')
+        if self.format == 'csv':
+            f.write(header + '\n')
+        return f
+
+    def number(self, value):
+        """
+        Text of a number, without the trailing zeros of the precision.
+        """
+        if self.precision < 0:
+            return repr(float(value))
+        text = '%.*f' % (self.precision, value)
+        return text.rstrip('0').rstrip('.') if '.' in text else text
+
+    def rows(self, f, first, second, typecode):
+        """
+        Write pairs of numbers, coordinates for typecode d, node numbers for I.
+        """
+        if self.format == 'bin':
+            data = array(typecode)
+            for pair in zip(first, second):
+                data.extend(pair)
+            if sys.byteorder != 'little':
+                data.byteswap()
+            data.tofile(f)
+            return
+        text = self.number if typecode == 'd' else str
+        line = '%s,%s\n' if self.format == 'csv' else '[%s, %s]\n'
+        f.write(''.join([line % (text(a), text(b)) for a, b in zip(first, second)]))
+
+    def scaled(self, values):
+        if self.precision < 0:
+            return [value / self.scale for value in values]
+        return [round(value / self.scale, self.precision) + 0.0 for value in values]
+
+    def pins(self, xs, ys):
+        """
+        Write pins.
+        """
+        self.rows(self.pointFile, self.scaled(xs), self.scaled(ys), 'd')
+        self.points += len(xs)
+
+    def remember(self, count):
+        """
+        Remember the nodes of the last count bands, None for all bands.
+        """
+        self.bands = deque(self.bands, maxlen=count)
+
+    def band(self, keep=False):
+        """
+        Start a new band of lines. The nodes of a kept band are remembered
+        until the end, for the last wedge of a circle that meets the first.
+        """
+        if keep:
+            self.kept = self.bands[-1]
+        self.bands.append({})
+
+    def node(self, key):
+        """
+        Number of a node written before, None when it is new or forgotten.
+        """
+        for nodes in self.bands:
+            number = nodes.get(key)
+            if number is not None:
+                return number
+        return self.kept.get(key)
+
+    def polyline(self, points):
+        """
+        Write the edges of a line through the points,
+        and the nodes that were not written before.
+        """
+        xs = self.scaled([point[0] for point in points])
+        ys = self.scaled([point[1] for point in points])
+        newX = []
+        newY = []
+        numbers = []
+        digits = self.precision if self.precision >= 0 else 6
+        for x, y in zip(xs, ys):
+            # the same node computed from different repeats differs in the last bits
+            key = (round(x, digits) + 0.0, round(y, digits) + 0.0)
+            number = self.node(key)
+            if number is None:
+                number = self.bands[-1][key] = self.points + len(newX)
+                newX.append(x)
+                newY.append(y)
+            numbers.append(number)
+        if newX:
+            self.rows(self.pointFile, newX, newY, 'd')
+            self.points += len(newX)
+        if self.edgeFile is None:
+            self.edgeFile = self.open(self.edgePath(), 'a,b')
+        self.rows(self.edgeFile, numbers[:-1], numbers[1:], 'I')
+        self.edges += len(numbers) - 1
+
+    def close(self):
+        self.pointFile.close()
+        if self.edgeFile is not None:
+            self.edgeFile.close()
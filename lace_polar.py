@@ -14,12 +14,21 @@
 # along with this program. If not, see http://www.gnu.org/licenses/.
 
 from __future__ import division
-from math import pi, sin, cos, tan, radians
+from math import pi, sin, cos, tan, radians, log, ceil
 from lxml import etree
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
 # We will use the inkex module with the predefined 
 # Effect base class.
 import inkex
+import lace_profile
+from lace_output import parameters, findGenerated, changedParameters, outputGroup, restyle
+from lace_output import draftBudget, PathEncoder, GeometryExport, EXPORT_FORMATS
+from lace_geometry import ORDERS, pinOrder, travel
 
 __author__ = 'Jo Pol'
 __credits__ = ['Veronika Irvine','Jo Pol','Mark Shafer']
@@ -31,6 +40,10 @@ class PolarGrid(inkex.Effect):
 	Creates a dotted polar grid where distance between the circles 
 	increase with the distance between the dots on the circles
 	"""
+
+	# options that only change the style of the dots
+	STYLE = ('dotFill',)
+
 	def __init__(self):
 		"""
 		Constructor.
@@ -50,26 +63,93 @@ class PolarGrid(inkex.Effect):
 		self.arg_parser.add_argument('-v', '--variant', action='store', type=str, dest='variant', default='', help='omit rows to get [|rectangle|hexagon1]')
 		self.arg_parser.add_argument('-cu', '--circleDiameterUnits', action='store', type=str, dest='circleDiameterUnits', default = 'mm', help = 'Circle diameter is measured in these units')
 		self.arg_parser.add_argument('-du', '--dotUnits', action='store', type=str, dest='dotUnits', default = 'px', help = 'Dot diameter is measured in these unites')
+		self.arg_parser.add_argument('--outputmode', action='store', type=str, dest='outputmode', default='circles', help='Output: circles (one per dot) or compound (one combined path per circle)')
+		self.arg_parser.add_argument('--order', action='store', type=str, dest='order', default='none', choices=ORDERS, help='Order of the dots: none (ring by ring), curve (fast), nearest or twoopt (shortest travel)')
+		self.arg_parser.add_argument('--report', action='store', type=inkex.Boolean, dest='report', default=False, help='Report the travel from dot to dot on stderr')
+		self.arg_parser.add_argument('--export', action='store', type=str, dest='export', default='', help='Write the dots to this file for other tools instead of drawing them')
+		self.arg_parser.add_argument('--exportformat', action='store', type=str, dest='exportformat', default='auto', choices=('auto',) + EXPORT_FORMATS, help='Format of the export: csv, jsonl, bin or auto (by the extension of the file)')
+		self.arg_parser.add_argument('--precision', action='store', type=int, dest='precision', default=3, help='Decimals of the positions of the dots, -1 for all')
+		self.arg_parser.add_argument('--replace', action='store', type=inkex.Boolean, dest='replace', default=True, help='Replace the grid generated before, the selected one or the last one in the layer')
+		self.arg_parser.add_argument('--preview', action='store', type=inkex.Boolean, dest='preview', default=False, help='Draw a draft: the first dots and the outer and inner ring')
+		self.arg_parser.add_argument('--budget', action='store', type=int, dest='budget', default=2000, help='Maximum number of dots of a draft')
+		self.arg_parser.add_argument('--profile', action='store', type=str, dest='profile', default='', help='Write timings and counts as JSON to this file, - for stderr')
+		self.budget = None
+		self.export = None
+		self.profile = lace_profile.NULL
+		self.travel = None
+		self.last = None
 
-	def group(self, diameter):
+	def group(self, diameter, label=None):
 		"""
-		Create a group labeled with the diameter
+		Create a group labeled with the diameter, its dots share its style.
+		None when exporting, there is no document to draw on
 		"""
-		label = 'diameter: {0:.2f} mm'.format(diameter)
-		attribs = {inkex.addNS('label', 'inkscape'):label}
+		if self.export:
+			return None
+		label = label or 'diameter: {0:.2f} mm'.format(diameter)
+		attribs = {inkex.addNS('label', 'inkscape'):label, 'style':self.dotStyle}
 		return etree.SubElement(self.gridContainer, inkex.addNS('g', 'svg'), attribs)
 
-	def dots(self, diameter, circleNr, group):
+	def positions(self, diameter, circleNr, dotNrs):
+		"""
+		Coordinates of the dots with the given numbers on a grid circle
+		"""
+		cosines, sines = self.angles[circleNr % 2]
+		radius = diameter / 2.0
+		if numpy is not None:
+			dotNrs = numpy.asarray(dotNrs, dtype=int)
+			xs = (radius * cosines[dotNrs] * self.circleScale).tolist()
+			ys = (radius * sines[dotNrs] * self.circleScale).tolist()
+		else:
+			xs = [radius * cosines[dotNr] * self.circleScale for dotNr in dotNrs]
+			ys = [radius * sines[dotNr] * self.circleScale for dotNr in dotNrs]
+		if self.profile:
+			self.profile.count('pins', len(xs))
+		return xs, ys
+
+	def dots(self, group, xs, ys):
 		"""
-		Draw dots on a grid circle
+		Draw dots in the given order, adds the distance from dot to dot to self.travel
 		"""
-		offset = (circleNr % 2) * 0.5
-		for dotNr in range (0, self.options.dotsPerCircle):
-			a = (dotNr + offset) * self.alpha
-			x = (diameter / 2.0) * cos(a)
-			y = (diameter / 2.0) * sin(a)
-			attribs = {'style':self.dotStyle, 'cx':str(x * self.circleScale), 'cy':str(y * self.circleScale), 'r':self.dotR}
-			etree.SubElement(group, inkex.addNS('circle', 'svg'), attribs)
+		if self.travel is not None and xs:
+			start = self.last or (xs[0], ys[0])
+			self.travel += travel([start[0]] + xs, [start[1]] + ys)
+			self.last = (xs[-1], ys[-1])
+		if self.export:
+			self.export.pins(xs, ys)
+			return
+		with self.profile.phase('elements'):
+			if self.options.outputmode == 'compound':
+				self.ringPath(group, xs, ys)
+				return
+			if self.profile:
+				self.profile.count('elements', len(xs))
+			tag = inkex.addNS('circle', 'svg')
+			number = self.encoder.number
+			r = number(self.dotRadius)
+			for x, y in zip(xs, ys):
+				attribs = {'cx':number(x), 'cy':number(y), 'r':r}
+				etree.SubElement(group, tag, attribs)
+
+	def ringPath(self, group, xs, ys):
+		"""
+		Draw the dots of a ring as one path. With self.caps a dot is a line
+		of length zero that the round caps of the stroke turn into a dot,
+		otherwise a circle of two half arcs
+		"""
+		if not xs:
+			return
+		if self.profile:
+			self.profile.count('elements')
+		encoder = self.encoder
+		encoder.reset()
+		if self.caps:
+			motions = [encoder.moveTo(x, y) + encoder.lineTo(x, y) for x, y in zip(xs, ys)]
+		else:
+			r = self.dotRadius
+			motions = [encoder.moveTo(x+r, y) + encoder.arcTo(r, 1, 0, x-r, y) + encoder.arcTo(r, 1, 0, x+r, y) + encoder.close()
+					   for x, y in zip(xs, ys)]
+		etree.SubElement(group, inkex.addNS('path', 'svg'), {'d':''.join(motions)})
 
 	def getUnittouu(self, param):
 		" compatibility between inkscape 0.48 and 0.91 "
@@ -78,40 +158,87 @@ class PolarGrid(inkex.Effect):
 		except AttributeError:
 			return inkex.unittouu(param)
 
-	def iterate(self, diameter, circleNr):
-		"""
-		Create a group with a ring of dots.
-		Returns half of the arc length between the dots
-		which becomes the distance to the next ring.
-		"""
-		group = self.group(diameter)
-		self.dots(diameter, circleNr, group)
-		self.generatedCircles.append(group)
-		return diameter * self.change
-
-	def generate(self):
+	def rings(self):
 		"""
-		Generate rings with dots, either inside out or outside in
+		Diameters of the rings with dots, either inside out or outside in.
+		Half of the arc length between the dots
+		becomes the distance to the next ring.
+		Returns the diameters, the minimum diameter
+		and whether the minimum had to grow to avoid overlapping dots.
 		"""
-		circleNr = 0
 		flag_error = False
 		minimum = 2 * self.options.dotSize * self.options.dotsPerCircle /pi
 		if minimum < self.options.innerDiameter:
 			minimum = self.options.innerDiameter
 		else:
 			flag_error = True
+		# each ring differs from the previous one by the same factor
 		if self.options.alignment == 'outside':
-			diameter = self.options.outerDiameter
-			while diameter > minimum:
-				diameter -= self.iterate(diameter, circleNr)
-				circleNr += 1
+			first, ratio, limit = self.options.outerDiameter, 1 - self.change, minimum
 		else:
-			diameter = minimum
-			while diameter < self.options.outerDiameter:
-				diameter += self.iterate(diameter, circleNr)
-				circleNr += 1
+			first, ratio, limit = minimum, 1 + self.change, self.options.outerDiameter
+		count = self.ringCount(first, ratio, limit)
+		if numpy is not None:
+			diameters = (first * ratio ** numpy.arange(count, dtype=float)).tolist()
+		else:
+			diameters = [first * ratio ** k for k in range(0, count)]
+		return diameters, minimum, flag_error
+
+	def ringCount(self, first, ratio, limit):
+		"""
+		Number of terms of the series first * ratio**k
+		before it grows beyond (ratio > 1) or shrinks below (ratio < 1) the limit
+		"""
+		if ratio > 1:
+			within = lambda d: d < limit
+		else:
+			within = lambda d: d > limit
+		if not within(first):
+			return 0
+		count = 1
+		if ratio > 0 and ratio != 1 and limit > 0:
+			count = max(1, int(ceil(log(limit / first) / log(ratio))))
+		# rounding may put the last term on the wrong side of the limit
+		while count > 1 and not within(first * ratio ** (count - 1)):
+			count -= 1
+		while within(first * ratio ** count):
+			count += 1
+		return count
+
+	def generate(self, mask, order='none'):
+		"""
+		Generate rings with dots, either inside out or outside in.
+		mask(ringCount) tells which dots to draw, see allDots.
+		An order other than none draws all dots in one group,
+		in the order of pinOrder instead of ring by ring.
+		"""
+		diameters, minimum, flag_error = self.rings()
+		dotNrs = mask(len(diameters))
+		allX = []
+		allY = []
+		for circleNr in range(0, len(diameters)):
+			if self.budget is not None and not self.budget:
+				break
+			if dotNrs[circleNr] is not None:
+				dots = dotNrs[circleNr]
+				if self.budget is not None:
+					dots = dots[:self.budget.take(len(dots))]
+				xs, ys = self.positions(diameters[circleNr], circleNr, dots)
+				if order != 'none':
+					allX.extend(xs)
+					allY.extend(ys)
+				else:
+					self.dots(self.group(diameters[circleNr]), xs, ys)
+		# Pins in an order with little travel for a pricking machine
+		if order != 'none' and allX:
+			with self.profile.phase('order'):
+				indexes = pinOrder(allX, allY, order)
+			group = self.group(None, 'dots in %s order' % order)
+			self.dots(group, [allX[i] for i in indexes], [allY[i] for i in indexes])
 		# Display message
-		if flag_error:
+		if flag_error and self.export:
+			inkex.errormsg("Dots overlap. inner changed to %4.1f" % (minimum))
+		elif flag_error:
 			# Leave message on top
 			font_height = 8
 			text_style = { 'font-size': str(font_height),
@@ -124,28 +251,89 @@ class PolarGrid(inkex.Effect):
 			text = etree.SubElement(self.gridContainer, 'text', text_atts)
 			text.text = "Dots overlap. inner changed to %4.1f" % (minimum)
 
-	def removeGroups(self, start, increment):
+	def outline(self, style):
+		"""
+		Draw the outer and the inner ring as circles, for a draft
+		"""
+		diameters = self.rings()[0]
+		for diameter in sorted(set([diameters[0], diameters[-1]]) if diameters else []):
+			attribs = {'style':style, 'cx':'0', 'cy':'0', 'r':self.encoder.number(diameter / 2.0 * self.circleScale)}
+			etree.SubElement(self.gridContainer, inkex.addNS('circle', 'svg'), attribs)
+
+	def allDots(self, ringCount):
+		"""
+		Mask with all dots of all rings:
+		for each ring the numbers of the dots to draw, None to omit the ring
+		"""
+		return [range(0, self.options.dotsPerCircle)] * ringCount
+
+	def removeGroups(self, dotNrs, start, increment):
 		"""
-		Remove complete rings with dots
+		Omit complete rings with dots
 		"""
-		for i in range(start, len(self.generatedCircles), increment):
-			self.svg.get_current_layer().remove(self.generatedCircles[i])
+		for i in range(start, len(dotNrs), increment):
+			dotNrs[i] = None
 
-	def removeDots(self, i, offset, step):
+	def removeDots(self, dotNrs, i, offset, step):
 		"""
-		Remove dots from one circle
+		Omit dots from one circle: every step-th of the remaining dots,
+		counting down from the last but offset
 		"""
-		group = self.generatedCircles[i]
-		dots = list(group)
-		start = len(dots) - 1 - offset
-		for j in range(start, -1, 0-step):
-			group.remove(dots[j])
+		if dotNrs[i] is None:
+			return
+		start = len(dotNrs[i]) - 1 - offset
+		dotNrs[i] = [dotNr for j, dotNr in enumerate(dotNrs[i]) if j > start or (start - j) % step]
+
+	def variantMask(self, ringCount):
+		"""
+		Mask with the dots of the variant
+		"""
+		dotNrs = self.allDots(ringCount)
+		if self.options.variant == 'rectangle':
+			self.removeGroups(dotNrs, 1, 2)
+		elif self.options.variant == 'hexagon1':
+			self.removeGroups(dotNrs, 0, 3)
+		elif self.options.variant == 'hexagon2' or self.options.variant == 'snow2':
+			for i in range(0, ringCount, 1):
+				self.removeDots(dotNrs, i, (((i%2)+1)*2)%3, 3)
+		elif self.options.variant == 'hexagon3':
+			for i in range(0, ringCount, 2):
+				self.removeDots(dotNrs, i, (i//2+1)%2, 2)
+		elif self.options.variant == 'hexagon4':
+			self.removeGroups(dotNrs, 0, 4)
+		elif self.options.variant == 'hexagon5' or self.options.variant == 'snow1':
+			for i in range(0, ringCount, 2):
+				self.removeDots(dotNrs, i, 1, 2)
+		return dotNrs
+
+	def snowMask(self, ringCount):
+		"""
+		Mask with the circles of the snow1 variant
+		"""
+		dotNrs = self.allDots(ringCount)
+		self.removeGroups(dotNrs, 1, 2)
+		for i in range(0, ringCount, 2):
+			self.removeDots(dotNrs, i, i%4, 2)
+		for i in range(0, ringCount, 2):
+			self.removeDots(dotNrs, i, (i+1)%2, 2)
+		for i in range(2, ringCount, 4):
+			self.removeDots(dotNrs, i, 0, self.options.dotsPerCircle)
+		return dotNrs
 
 	def computations(self, angle):
 		self.alpha = radians(360.0 / self.options.dotsPerCircle)
 		correction = pi / (4 * self.options.dotsPerCircle)
 		correction *= tan(angle*0.93)
 		self.change = tan(angle - correction) * pi / self.options.dotsPerCircle
+		# the dots of every other ring are shifted half a step
+		self.angles = []
+		for offset in (0, 0.5):
+			angles = [(dotNr + offset) * self.alpha for dotNr in range(0, self.options.dotsPerCircle)]
+			cosines = [cos(a) for a in angles]
+			sines = [sin(a) for a in angles]
+			if numpy is not None:
+				cosines, sines = numpy.array(cosines), numpy.array(sines)
+			self.angles.append((cosines, sines))
 
 	def effect(self):
 		"""
@@ -153,51 +341,83 @@ class PolarGrid(inkex.Effect):
 		Overrides base class' method and draws something.
 		"""
 
+		self.budget = draftBudget(self.options)
+		params = parameters(self.options)
+		old = findGenerated(self.svg, 'polar') if self.options.replace else None
+
+		self.encoder = PathEncoder(self.options.precision)
+		with self.profile.phase('units'):
+			self.dotScale = self.getUnittouu("1" + self.options.dotUnits)
+			self.dotRadius = self.options.dotSize * (self.dotScale/2)
+			self.circleScale = self.getUnittouu("1" + self.options.circleDiameterUnits)
+
 		# constants
-		self.dotStyle = str(inkex.Style({'fill': self.options.dotFill.to_rgb(),'stroke':'none'}))
-		self.dotScale = self.getUnittouu("1" + self.options.dotUnits)
-		self.dotR = str(self.options.dotSize * (self.dotScale/2))
-		self.circleScale = self.getUnittouu("1" + self.options.circleDiameterUnits)
+		color = self.options.dotFill.to_rgb()
+		dotStyle = str(inkex.Style({'fill': color,'stroke':'none'}))
+		capStyle = str(inkex.Style({'fill': 'none','stroke':color,'stroke-width':self.encoder.number(2 * self.dotRadius),'stroke-linecap':'round'}))
+		ringStyle = str(inkex.Style({'fill': 'none','stroke':color,'stroke-width':0.7}))
+		# Only the positions of the dots, for other tools
+		if self.options.export:
+			self.budget = None
+			old = None
+			self.export = GeometryExport(self.options.export, self.options.exportformat, self.circleScale, self.options.precision)
+		if old is not None and changedParameters(old, params).issubset(self.STYLE):
+			# the same dots only need the new color, the message keeps its style
+			restyle(old, lambda style: style if 'font-size' in style else capStyle if 'linecap:round' in style
+					else ringStyle if 'fill:none' in style else dotStyle, params)
+			return
+		self.caps = self.options.outputmode == 'compound'
+		self.dotStyle = capStyle if self.caps else dotStyle
 		self.computations(radians(self.options.angleOnFootside))
 
 		# processing variables
-		self.generatedCircles = []
-		self.gridContainer =  self.svg.get_current_layer()
+		self.gridContainer = None if self.export else outputGroup(self.svg, 'polar', params, old)
+		self.profile.instrument(self, 'group', 'elements', 'elements')
+		self.profile.instrument(self, 'generate', 'geometry')
 
-		self.generate()
+		if self.options.report or self.profile:
+			self.travel = 0.0
+		self.generate(self.variantMask, self.options.order)
+		if self.budget is not None:
+			self.outline(ringStyle)
+		if self.travel is not None:
+			distance = self.travel / self.circleScale
+			self.profile.count('travel', round(distance, 3))
+			if self.options.report:
+				inkex.errormsg('travel from dot to dot: %.1f %s' % (distance, self.options.circleDiameterUnits))
+			# the rings of the snow variants are no pins
+			self.travel = None
+		if self.export:
+			self.export.close()
+			return
 
-		if self.options.variant == 'rectangle':
-			self.removeGroups(1, 2)
-		elif self.options.variant == 'hexagon1':
-			self.removeGroups(0, 3)
-		elif self.options.variant == 'hexagon2' or self.options.variant == 'snow2':
-			for i in range(0, len(self.generatedCircles), 1):
-				self.removeDots(i, (((i%2)+1)*2)%3, 3)
-		elif self.options.variant == 'hexagon3':
-			for i in range(0, len(self.generatedCircles), 2):
-				self.removeDots(i, (i//2+1)%2, 2)
-		elif self.options.variant == 'hexagon4':
-			self.removeGroups(0, 4)
-		elif self.options.variant == 'hexagon5' or self.options.variant == 'snow1':
-			for i in range(0, len(self.generatedCircles), 2):
-				self.removeDots(i, 1, 2)
-
-		self.dotStyle = str(inkex.Style({'fill': 'none','stroke':self.options.dotFill.to_rgb(),'stroke-width':0.7}))
-		self.dotR = str((((self.options.innerDiameter * pi) / self.options.dotsPerCircle) / 2) * self.dotScale)
-		self.generatedCircles = []
+		self.dotStyle = ringStyle
+		self.caps = False
+		self.dotRadius = ((((self.options.innerDiameter * pi) / self.options.dotsPerCircle) / 2) * self.dotScale)
 		if self.options.variant == 'snow2':
 			self.options.dotsPerCircle = self.options.dotsPerCircle // 3
 			self.computations(radians(self.options.angleOnFootside))
-			self.generate()
+			self.generate(self.allDots)
 		elif self.options.variant == 'snow1':
-			self.generate()
-			self.removeGroups(1, 2)
-			for i in range(0, len(self.generatedCircles), 2):
-				self.removeDots(i, i%4, 2)
-			for i in range(0, len(self.generatedCircles), 2):
-				self.removeDots(i, (i+1)%2, 2)
-			for i in range(2, len(self.generatedCircles), 4):
-				self.removeDots(i, 0, self.options.dotsPerCircle)
+			self.generate(self.snowMask)
+
+	def load_raw(self):
+		"""
+		Read the document, timed when profiling.
+		"""
+		self.profile = lace_profile.create('polar', self.options.profile)
+		with self.profile.phase('load'):
+			inkex.Effect.load_raw(self)
+
+	def save_raw(self, ret):
+		"""
+		Write the document and the profile report.
+		"""
+		with self.profile.phase('save'):
+			inkex.Effect.save_raw(self, ret)
+		if self.profile:
+			self.profile.count('bytes', lace_profile.outputSize(self.options.output))
+			self.profile.write()
 
 # Create effect instance and apply it.
 if __name__ == '__main__':
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2026, the inkscape-bobbinlace contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Timings and counts of a run, shared by the grid and ground extensions.
+
+An effect times its phases with
+
+    with self.profile.phase('geometry'):
+        ...
+
+and counts what it generates with self.profile.count('pins', n). The time of
+a phase excludes the time of the phases nested in it, so the phases add up
+to the whole run. At the end the report is written as JSON to the file
+given by --profile or by the LACE_PROFILE environment variable, '-' writes
+it to stderr.
+
+Without a target the effects get NULL, which does nothing and is false, so
+counting can be skipped with `if self.profile:` and nothing is measured.
+"""
+
+import os
+import sys
+import json
+import time
+
+__license__ = 'Simplified BSD'
+__version__ = '__VERSION__'
+
+# environment variable with the target of the report
+VARIABLE = 'LACE_PROFILE'
+
+
+class Phase(object):
+    """
+    Context that times one phase of a profile.
+    """
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile.begin(self.name)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.profile.end()
+        return False
+
+
+class Profile(object):
+    """
+    Time spent per phase and counters of one run.
+    """
+
+    def __init__(self, name, target):
+        """
+        name tells which effect ran, target is a file name or '-' for stderr.
+        """
+        self.name = name
+        self.target = target
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+        # entries: name, start, time spent in nested phases
+        self.stack = []
+        self.start = time.perf_counter()
+
+    def __bool__(self):
+        return True
+
+    def phase(self, name):
+        """
+        Context that adds its time to the phase with this name.
+        """
+        return Phase(self, name)
+
+    def begin(self, name):
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def end(self):
+        name, start, nested = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.seconds[name] = self.seconds.get(name, 0.0) + elapsed - nested
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def count(self, name, n=1):
+        """
+        Add n to a counter, None when unknown adds nothing.
+        """
+        if n is not None:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def instrument(self, owner, method, phase, counter=None):
+        """
+        Time every call of a method of an object as a phase,
+        and count the calls when a counter is given.
+        Only this object is changed, the class keeps its method.
+        """
+        original = getattr(owner, method)
+
+        def timed(*args, **kwargs):
+            if counter:
+                self.count(counter)
+            self.begin(phase)
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.end()
+        setattr(owner, method, timed)
+
+    def report(self):
+        """
+        The timings and counters as a dictionary.
+        """
+        return {
+            'effect': self.name,
+            'seconds': round(time.perf_counter() - self.start, 6),
+            'phases': dict((name, {'seconds': round(seconds, 6), 'calls': self.calls[name]})
+                           for name, seconds in self.seconds.items()),
+            'counters': self.counters,
+        }
+
+    def write(self):
+        """
+        Write the report to the target.
+        """
+        text = json.dumps(self.report(), indent=1, sort_keys=True)
+        if self.target == '-':
+            sys.stderr.write(text + '\n')
+        else:
+            with open(self.target, 'w') as f:
+                f.write(text + '\n')
+
+
+class NullProfile(object):
+    """
+    Profile that measures nothing.
+    """
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return False
+
+    def phase(self, name):
+        return self
+
+    def count(self, name, n=1):
+        pass
+
+    def instrument(self, owner, method, phase, counter=None):
+        pass
+
+    def write(self):
+        pass
+
+
+NULL = NullProfile()
+
+
+def create(name, target=None):
+    """
+    A profile for the effect with this name, written to target or to the
+    target in the environment. NULL when neither is given.
+    """
+    target = target or os.environ.get(VARIABLE)
+    if not target:
+        return NULL
+    return Profile(name, target)
+
+
+def outputSize(output):
+    """
+    Number of bytes written to an output file name or stream, None if unknown.
+    """
+    if isinstance(output, str):
+        return os.path.getsize(output) if os.path.isfile(output) else None
+    try:
+        return output.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
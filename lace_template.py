@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2026, the inkscape-bobbinlace contributors
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Template loader shared by the ground extensions.
+
+A template file looks like:
+TYPE    N1    N2
+[x1,y1,x2,y2,x3,y3] [x4,y4,x5 ...
+
+Each file is parsed once and compiled into a compact binary form in a cache
+directory. The compiled form holds both the straight layout used by
+lace_ground.py and the layout rotated 90 degrees clockwise used by
+lace_circular_ground.py. It is recompiled when the modification time or the
+size of the text file changes.
+
+Run this module as a script to compile templates ahead of time:
+    python lace_template.py templates/*.txt
+"""
+
+import os
+import struct
+import hashlib
+from array import array
+
+__license__ = 'Simplified BSD'
+__version__ = '__VERSION__'
+
+MAGIC = b'LACT'
+FORMAT = 1
+# magic, format, source mtime (ns), source size, length of type, N1, N2, number of rows
+HEADER = struct.Struct('=4sHqqHiiI')
+
+
+def cacheDir():
+    """
+    Directory for compiled templates.
+    Taken from the LACE_TEMPLATE_CACHE environment variable if set.
+    """
+    directory = os.environ.get('LACE_TEMPLATE_CACHE')
+    if directory:
+        return directory
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'inkscape-bobbinlace', 'templates')
+
+
+def cachePath(fileName, directory=None):
+    """
+    Location of the compiled form of the template file.
+    """
+    key = hashlib.sha1(os.path.abspath(fileName).encode('utf-8')).hexdigest()
+    return os.path.join(directory or cacheDir(), key + '.bin')
+
+
+def parseTemplate(fileName):
+    """
+    Parse the text of a template file.
+    Returns the type, the two numbers of the first line,
+    the number of cells on each line and the flat list of cell coordinates.
+    """
+    type = ''
+    n1, n2 = 0, 0
+    counts = []
+    coords = []
+    with open(fileName, 'r') as f:
+        first = True
+        for line in f:
+            line = line.strip()
+            if first:
+                # first line of file gives the dimensions of the template
+                first = False
+                temp = line.split('\t')
+                type = temp[0]
+                n1 = int(temp[1])
+                n2 = int(temp[-1])
+            else:
+                line = line.lstrip('[')
+                line = line.rstrip(']')
+                rowData = line.split(']\t[')
+                counts.append(len(rowData))
+                for cell in rowData:
+                    coords.extend([float(num) for num in cell.strip().split(',')])
+    return type, n1, n2, counts, coords
+
+
+def rotate(coords, rows, cols):
+    """
+    Rotate flat cell coordinates 90 degrees clockwise:
+    every (x, y) becomes (rows - y, cols - x).
+    """
+    rotated = array('d', coords)
+    rotated[0::2] = array('d', [rows - y for y in coords[1::2]])
+    rotated[1::2] = array('d', [cols - x for x in coords[0::2]])
+    return rotated
+
+
+def compileTemplate(fileName, target):
+    """
+    Parse a template file and write its compiled form to target.
+    Returns the same values as parseTemplate plus the rotated coordinates.
+    """
+    stat = os.stat(fileName)
+    type, n1, n2, counts, coords = parseTemplate(fileName)
+    straight = array('d', coords)
+    # the circular ground reads the first line as cols, rows
+    rotated = rotate(straight, n2, n1)
+    typeBytes = type.encode('utf-8')
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp = '%s.%d.tmp' % (target, os.getpid())
+        with open(temp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT, stat.st_mtime_ns, stat.st_size,
+                                len(typeBytes), n1, n2, len(counts)))
+            f.write(typeBytes)
+            f.write(array('I', counts).tobytes())
+            f.write(straight.tobytes())
+            f.write(rotated.tobytes())
+        os.replace(temp, target)
+    except OSError:
+        # a cache that can't be written only costs speed
+        pass
+    return type, n1, n2, counts, straight, rotated
+
+
+def readCompiled(fileName, source):
+    """
+    Read the compiled form of a template.
+    Returns None when it is missing, damaged or outdated.
+    """
+    try:
+        with open(fileName, 'rb') as f:
+            buffer = f.read()
+    except OSError:
+        return None
+    if len(buffer) < HEADER.size:
+        return None
+    magic, format, mtime, size, typeLength, n1, n2, rowCount = HEADER.unpack_from(buffer)
+    if magic != MAGIC or format != FORMAT:
+        return None
+    stat = os.stat(source)
+    if mtime != stat.st_mtime_ns or size != stat.st_size:
+        return None
+    offset = HEADER.size
+    type = buffer[offset:offset+typeLength].decode('utf-8')
+    offset += typeLength
+    counts = array('I')
+    counts.frombytes(buffer[offset:offset+rowCount*counts.itemsize])
+    offset += rowCount*counts.itemsize
+    length = 6*sum(counts)*array('d').itemsize
+    if len(buffer) != offset + 2*length:
+        return None
+    straight = array('d')
+    straight.frombytes(buffer[offset:offset+length])
+    rotated = array('d')
+    rotated.frombytes(buffer[offset+length:])
+    return type, n1, n2, counts, straight, rotated
+
+
+def loadCompiled(fileName, directory=None):
+    """
+    Compiled form of a template, from the cache when it is up to date.
+    """
+    target = cachePath(fileName, directory)
+    compiled = readCompiled(target, fileName)
+    if compiled is None:
+        compiled = compileTemplate(fileName, target)
+    return compiled
+
+
+def cells(counts, coords):
+    """
+    Split flat coordinates into lines of cells of six numbers.
+    """
+    data = []
+    start = 0
+    for count in counts:
+        data.append([coords[i:i+6].tolist() for i in range(start, start+6*count, 6)])
+        start += 6*count
+    return data
+
+
+def loadTemplate(fileName, rotated=False, directory=None):
+    """
+    Load a template file.
+    Returns {'type', 'rowCount', 'colCount', 'data'} as used by lace_ground.py
+    or, when rotated, {'type', 'rows', 'cols', 'data'} as used by lace_circular_ground.py
+    """
+    type, n1, n2, counts, straight, turned = loadCompiled(fileName, directory)
+    if rotated:
+        return {'type': type, 'rows': n2, 'cols': n1, 'data': cells(counts, turned)}
+    return {'type': type, 'rowCount': n1, 'colCount': n2, 'data': cells(counts, straight)}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compile lace ground templates into the cache.')
+    parser.add_argument('files', nargs='+', help='template files (.txt)')
+    parser.add_argument('--cache', help='cache directory, default: %s' % cacheDir())
+    args = parser.parse_args()
+    for name in args.files:
+        compileTemplate(name, cachePath(name, args.cache))
+    print('%d templates compiled into %s' % (len(args.files), args.cache or cacheDir()))
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lace_geometry
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def geometry(request, monkeypatch):
+    """lace_geometry with and without numpy."""
+    if request.param == 'numpy':
+        if lace_geometry.numpy is None:
+            pytest.skip('numpy is not installed')
+    else:
+        monkeypatch.setattr(lace_geometry, 'numpy', None)
+    return lace_geometry
@@ -0,0 +1,69 @@
+import os
+import shutil
+
+import pytest
+
+import lace_catalogue
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+
+@pytest.fixture
+def directory(tmp_path, monkeypatch):
+    """A template directory with two templates and its catalogue, and an empty cache."""
+    monkeypatch.setenv('LACE_TEMPLATE_CACHE', str(tmp_path / 'cache'))
+    directory = tmp_path / 'templates'
+    directory.mkdir()
+    for name in ('2x2_2.txt', '4x4_10.txt'):
+        shutil.copy(os.path.join(TEMPLATES, name), str(directory / name))
+    lace_catalogue.loadCatalogue(str(directory), rebuild=True)
+    return directory
+
+
+def described(monkeypatch):
+    names = []
+    describe = lace_catalogue.describe
+
+    def counting(fileName):
+        names.append(os.path.basename(fileName))
+        return describe(fileName)
+    monkeypatch.setattr(lace_catalogue, 'describe', counting)
+    return names
+
+
+def test_shipped_catalogue_is_current(monkeypatch, tmp_path):
+    monkeypatch.setenv('LACE_TEMPLATE_CACHE', str(tmp_path))
+    names = described(monkeypatch)
+    catalogue = lace_catalogue.loadCatalogue(TEMPLATES)
+    assert names == []
+    assert len(catalogue['templates']) == len(lace_catalogue.templateNames(TEMPLATES))
+
+
+def test_new_times_keep_the_catalogue(directory, monkeypatch):
+    for name in os.listdir(str(directory)):
+        os.utime(str(directory / name), (1, 1))
+    names = described(monkeypatch)
+    lace_catalogue.loadCatalogue(str(directory))
+    assert names == []
+
+
+def test_edited_template_is_described_again(directory, monkeypatch):
+    shutil.copy(os.path.join(TEMPLATES, '4x4_11.txt'), str(directory / '4x4_10.txt'))
+    names = described(monkeypatch)
+    catalogue = lace_catalogue.loadCatalogue(str(directory))
+    assert names == ['4x4_10.txt']
+    expected = lace_catalogue.describe(os.path.join(TEMPLATES, '4x4_11.txt'))
+    expected.update(name='4x4_10', file='4x4_10.txt', image=None)
+    assert catalogue['templates'][1] == expected
+    # the update is kept in the cache
+    del names[:]
+    lace_catalogue.loadCatalogue(str(directory))
+    assert names == []
+
+
+def test_added_template_is_described(directory, monkeypatch):
+    shutil.copy(os.path.join(TEMPLATES, '1x1_1.txt'), str(directory / '1x1_1.txt'))
+    names = described(monkeypatch)
+    catalogue = lace_catalogue.loadCatalogue(str(directory))
+    assert names == ['1x1_1.txt']
+    assert [entry['name'] for entry in catalogue['templates']] == ['1x1_1', '2x2_2', '4x4_10']
@@ -0,0 +1,212 @@
+import random
+
+import pytest
+
+import lace_geometry
+
+
+def rounded(segments, digits=9):
+    return [[round(v, digits) + 0.0 for v in segment] for segment in segments]
+
+
+RECTANGLE_CASES = [
+    # inside, kept as it is
+    ((1, 1, 4, 3), [1, 1, 4, 3]),
+    # crossing one border, cut exactly on it
+    ((-2, 1, 2, 1), [0, 1, 2, 1]),
+    ((5, 5, 15, 5), [5, 5, 10, 5]),
+    # crossing two borders
+    ((-5, 5, 15, 5), [0, 5, 10, 5]),
+    # outside
+    ((-3, -3, -1, -1), None),
+    ((11, 0, 12, 10), None),
+    # along the border
+    ((0, 0, 10, 0), [0, 0, 10, 0]),
+    ((10, 0, 10, 10), [10, 0, 10, 10]),
+    # touching a corner only
+    ((-1, 1, 1, -1), None),
+    # leaving a node on the border
+    ((0, 0, -2.5, 2.5), None),
+    ((0, 5, -2.5, 6), None),
+    ((10, 5, 12.5, 7.5), None),
+    ((5, 10, 5.5, 12.5), None),
+    # entering from a node on the border
+    ((0, 0, 2.5, 2.5), [0, 0, 2.5, 2.5]),
+    # a point
+    ((3, 3, 3, 3), [3, 3, 3, 3]),
+    ((-3, 3, -3, 3), None),
+]
+
+
+@pytest.mark.parametrize('segment, expected', RECTANGLE_CASES)
+def test_rectangle_clip(segment, expected):
+    clipped = lace_geometry.Rectangle(10, 10).clip(*segment)
+    assert (clipped if clipped is None else rounded([clipped])[0]) == expected
+
+
+def test_rectangle_segments(geometry):
+    segments = [segment for segment, expected in RECTANGLE_CASES]
+    expected = [expected for segment, expected in RECTANGLE_CASES if expected is not None]
+    assert rounded(geometry.Rectangle(10, 10).segments(segments)) == expected
+
+
+def test_rectangle_border_nodes(geometry):
+    # the lines of a lattice leaving the nodes on the border of the patch
+    rectangle = geometry.Rectangle(50, 50)
+    segments = []
+    for i in range(0, 21):
+        t = i * 2.5
+        segments += [(0, t, -2.5, t + 2.5), (0, t, -2.5, t - 2.5),
+                     (50, t, 52.5, t + 2.5), (t, 50, t + 2.5, 52.5), (t, 0, t - 2.5, -2.5)]
+    assert rectangle.segments(segments) == []
+    assert [rectangle.clip(*segment) for segment in segments] == [None] * len(segments)
+
+
+def lattice(n=12, unit=2.5):
+    xs = [i * unit for i in range(n) for j in range(n)]
+    ys = [j * unit for i in range(n) for j in range(n)]
+    return xs, ys
+
+
+def test_jitter_same_seed_same_nudges(geometry):
+    xs, ys = lattice()
+    first = geometry.Jitter(0.5, 0.3, 2.5, 2.5, seed=7).points(xs, ys)
+    second = geometry.Jitter(0.5, 0.3, 2.5, 2.5, seed=7).points(xs, ys)
+    assert first == second
+    other = geometry.Jitter(0.5, 0.3, 2.5, 2.5, seed=8).points(xs, ys)
+    assert other != first
+
+
+def test_jitter_independent_of_order(geometry):
+    xs, ys = lattice()
+    jitter = geometry.Jitter(0.5, 0.3, 2.5, 2.5, seed=7)
+    nx, ny = jitter.points(xs, ys)
+    rx, ry = jitter.points(xs[::-1], ys[::-1])
+    assert (rx[::-1], ry[::-1]) == (nx, ny)
+    # and of rounding errors of the lattice positions
+    assert jitter.points([x + 1e-9 for x in xs], ys) == (nx, ny)
+
+
+def test_jitter_bounds(geometry):
+    xs, ys = lattice()
+    nx, ny = geometry.Jitter(0.5, 0.3, 2.5, 2.5, seed=7).points(xs, ys)
+    assert all(abs(a - b) <= 0.5 for a, b in zip(nx, xs))
+    assert all(abs(a - b) <= 0.3 for a, b in zip(ny, ys))
+    assert any(a != b for a, b in zip(nx, xs))
+
+
+def test_jitter_numpy_matches_python(monkeypatch):
+    if lace_geometry.numpy is None:
+        pytest.skip('numpy is not installed')
+    xs, ys = lattice()
+    jitter = lace_geometry.Jitter(0.5, 0.3, 2.5, 2.5, seed=7)
+    fastX, fastY = jitter.points(xs, ys)
+    monkeypatch.setattr(lace_geometry, 'numpy', None)
+    slowX, slowY = jitter.points(xs, ys)
+    assert slowX == pytest.approx(fastX, abs=1e-12)
+    assert slowY == pytest.approx(fastY, abs=1e-12)
+
+
+def test_jitter_segments_share_nodes(geometry):
+    jitter = geometry.Jitter(0.5, 0.5, 2.5, 2.5, seed=3)
+    first, second = jitter.segments([(0, 0, 2.5, 2.5), (2.5, 2.5, 5, 0)])
+    assert first[2:] == second[:2]
+
+
+def test_edgeset_drops_repeated_segments(geometry):
+    edges = geometry.EdgeSet(2.5, 2.5)
+    first = [(0, 0, 2.5, 2.5), (2.5, 2.5, 5, 0), (0, 0, 2.5, 2.5)]
+    assert edges.unique(first) == [(0, 0, 2.5, 2.5), (2.5, 2.5, 5, 0)]
+    # either direction, with rounding errors, from a later band
+    second = [(5, 0, 2.5, 2.5 + 1e-9), (5, 0, 7.5, 2.5)]
+    assert edges.unique(second) == [(5, 0, 7.5, 2.5)]
+    assert edges.removed == 2
+
+
+def test_edgeset_keeps_fresh_bands_as_they_are(geometry):
+    edges = geometry.EdgeSet(2.5, 2.5)
+    band = [(0, 0, 2.5, 2.5), (2.5, 2.5, 5, 0)]
+    assert edges.unique(band) is band
+    assert edges.removed == 0
+
+
+def test_edgeset_window(geometry):
+    edges = geometry.EdgeSet(1, 1, window=1)
+    segment = [(0, 0, 1, 1)]
+    assert edges.unique(segment) == segment
+    assert edges.unique([(5, 5, 6, 6)]) == [(5, 5, 6, 6)]
+    # two bands later the first band is forgotten
+    assert edges.unique(segment) == segment
+    assert edges.unique([(5, 5, 6, 6)]) == [(5, 5, 6, 6)]
+    unbounded = geometry.EdgeSet(1, 1)
+    for band in (segment, [(5, 5, 6, 6)], [(2, 2, 3, 3)]):
+        unbounded.unique(band)
+    assert unbounded.unique(segment) == []
+
+
+def walked(polylines, tolerance=1e-6):
+    """The edges of the polylines, as sorted pairs of rounded points."""
+    edges = []
+    for polyline in polylines:
+        for p, q in zip(polyline[:-1], polyline[1:]):
+            p = (round(p[0] / tolerance), round(p[1] / tolerance))
+            q = (round(q[0] / tolerance), round(q[1] / tolerance))
+            edges.append((min(p, q), max(p, q)))
+    return sorted(edges)
+
+
+# segments and the fewest walks that cover them
+CHAIN_CASES = {
+    'path': ([(0, 0, 1, 0), (1, 0, 2, 1), (2, 1, 3, 0)], 1),
+    'square': ([(0, 0, 1, 0), (1, 0, 1, 1), (1, 1, 0, 1), (0, 1, 0, 0)], 1),
+    'star': ([(0, 0, 1, 0), (0, 0, -1, 0), (0, 0, 0, 1), (0, 0, 0, -1), (0, 0, 1, 1)], 3),
+    'apart': ([(0, 0, 1, 0), (5, 5, 6, 6), (6, 6, 5, 5 + 1e-9)], 2),
+}
+
+
+@pytest.mark.parametrize('name', sorted(CHAIN_CASES))
+def test_chain_covers_every_edge_once(name):
+    segments, walks = CHAIN_CASES[name]
+    polylines = lace_geometry.chain(segments)
+    assert walked(polylines) == walked([[s[:2], s[2:]] for s in segments])
+    assert len(polylines) == walks
+
+
+def test_chain_lattice():
+    # the diagonals of a lattice with its nodes nudged, as the ground draws them
+    jitter = lace_geometry.Jitter(0.3, 0.3, 1, 1, seed=5)
+    segments = []
+    for i in range(10):
+        for j in range(10):
+            segments += [(i, j, i + 1, j + 1), (i + 1, j, i, j + 1)]
+    segments = jitter.segments(segments)
+    polylines = lace_geometry.chain(segments)
+    assert walked(polylines) == walked([[s[:2], s[2:]] for s in segments])
+    # one walk for each pair of odd nodes, the corners, or for each
+    # connected part without them: the diagonals of (i + j) odd form one
+    assert len(polylines) == 4 // 2 + 1
+
+
+def bruteForcePairs(xs, ys, threshold):
+    return sorted((i, j) for i in range(len(xs)) for j in range(i + 1, len(xs))
+                  if (xs[i] - xs[j]) ** 2 + (ys[i] - ys[j]) ** 2 < threshold ** 2)
+
+
+def test_close_pairs_match_brute_force(geometry):
+    rng = random.Random(11)
+    xs = [rng.uniform(-5, 5) for i in range(300)]
+    ys = [rng.uniform(-5, 5) for i in range(300)]
+    # points on top of each other and on the edges of the cells
+    xs += [1.0, 1.0, 0.5, 0.0, -0.5]
+    ys += [1.0, 1.0, 0.0, 0.5, 0.0]
+    for threshold in (0.05, 0.5, 2.0):
+        assert sorted(geometry.closePairs(xs, ys, threshold)) == bruteForcePairs(xs, ys, threshold)
+
+
+def test_close_pairs_edge_cases(geometry):
+    assert geometry.closePairs([], [], 1) == []
+    assert geometry.closePairs([0], [0], 1) == []
+    assert geometry.closePairs([0, 0], [0, 0], 0) == []
+    # exactly the threshold apart is not close
+    assert geometry.closePairs([0, 1], [0, 0], 1) == []
+    assert sorted(geometry.closePairs([0, 1, 0.25], [0, 0, 0], 1)) == [(0, 2), (1, 2)]
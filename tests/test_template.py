@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import pytest
+
+import lace_template
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+
+@pytest.fixture
+def template(tmp_path):
+    """A copy of a template that the tests may edit."""
+    fileName = str(tmp_path / 'ground.txt')
+    shutil.copy(os.path.join(TEMPLATES, '4x4_10.txt'), fileName)
+    return fileName
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """The names of the files parsed from now on."""
+    names = []
+    parse = lace_template.parseTemplate
+
+    def counting(fileName):
+        names.append(os.path.basename(fileName))
+        return parse(fileName)
+    monkeypatch.setattr(lace_template, 'parseTemplate', counting)
+    return names
+
+
+def test_compiled_matches_text(template, tmp_path):
+    type, n1, n2, counts, coords = lace_template.parseTemplate(template)
+    for attempt in range(2):
+        loaded = lace_template.loadTemplate(template, directory=str(tmp_path / 'cache'))
+        assert (loaded['type'], loaded['rowCount'], loaded['colCount']) == (type, n1, n2)
+        assert [len(line) for line in loaded['data']] == counts
+        assert [v for line in loaded['data'] for cell in line for v in cell] == coords
+    rotated = lace_template.loadTemplate(template, rotated=True, directory=str(tmp_path / 'cache'))
+    assert (rotated['rows'], rotated['cols']) == (n2, n1)
+    assert [v for line in rotated['data'] for cell in line for v in cell] == \
+        list(lace_template.rotate(coords, n2, n1))
+
+
+def test_cache_is_used(template, tmp_path, parsed):
+    lace_template.loadCompiled(template, str(tmp_path / 'cache'))
+    lace_template.loadCompiled(template, str(tmp_path / 'cache'))
+    assert parsed == ['ground.txt']
+
+
+def test_edited_template_is_compiled_again(template, tmp_path, parsed):
+    cache = str(tmp_path / 'cache')
+    lace_template.loadCompiled(template, cache)
+    shutil.copy(os.path.join(TEMPLATES, '4x4_11.txt'), template)
+    type, n1, n2, counts, straight, rotated = lace_template.loadCompiled(template, cache)
+    assert parsed == ['ground.txt', 'ground.txt']
+    assert list(straight) == lace_template.parseTemplate(os.path.join(TEMPLATES, '4x4_11.txt'))[4]
+
+
+def test_same_size_new_time_is_compiled_again(template, tmp_path, parsed):
+    cache = str(tmp_path / 'cache')
+    lace_template.loadCompiled(template, cache)
+    stat = os.stat(template)
+    os.utime(template, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    lace_template.loadCompiled(template, cache)
+    assert parsed == ['ground.txt', 'ground.txt']
+
+
+def test_damaged_cache_is_compiled_again(template, tmp_path, parsed):
+    cache = str(tmp_path / 'cache')
+    first = lace_template.loadCompiled(template, cache)
+    target = lace_template.cachePath(template, cache)
+    with open(target, 'r+b') as f:
+        f.truncate(os.path.getsize(target) - 8)
+    assert lace_template.loadCompiled(template, cache) == first
+    assert parsed == ['ground.txt', 'ground.txt']
+
+
+def test_unwritable_cache(template, tmp_path):
+    # a file where the cache directory should be
+    blocked = tmp_path / 'blocked'
+    blocked.write_text('')
+    loaded = lace_template.loadTemplate(template, directory=str(blocked / 'cache'))
+    assert loaded['type'] == lace_template.parseTemplate(template)[0]